@@ -0,0 +1,140 @@
+### Benchmarks of supporting actors, casts, casts stealing work, collectors and relays,
+### and of creating and starting many actors at once (startup, with an actor for each message)
+###
+### Each benchmark runs in a process of its own and reports:
+###     msgs_per_sec - messages received per second, from the first put until the last message is received
+###     p50_latency_secs, p99_latency_secs - seconds from putting a message until it is received
+###     construct_secs - seconds spent creating the actors
+###     start_secs - seconds from starting reception until the first message is received
+###     call_secs - seconds spent starting reception of every actor
+###     cut_secs - seconds from receiving the last message until every actor is done
+###     max_rss_kb - the peak resident set size in kilobytes of the largest process started
+###
+### Results are written as JSON so they may be compared across versions, e.g.
+###
+###     python benchmarks/bench.py --messages 10000 --output results.json
+
+from caine import SupportingActor, SupportingCast, Collector, RingInbox, Cut
+import multiprocessing
+import resource
+import argparse
+import platform
+import json
+import time
+import sys
+
+_benchmarks = ['actor', 'cast', 'steal', 'collector', 'relay', 'startup']
+
+def record(message, instance_attributes):
+    instance_attributes['received_at'][message[0]] = time.time()           # Each message has its own slot, so no lock is needed.
+
+def relay(message, instance_attributes):
+    instance_attributes['outbox'].put(message)
+
+def collect(message, count, instance_attributes):
+    record(message, instance_attributes)
+    return (count or 0) + 1
+
+def relay_cut(instance_attributes):
+    instance_attributes['outbox'].put(Cut)
+
+def done(instance_attributes):
+    pass                                                                    # Print nothing, so that JSON written to stdout stays valid.
+
+def make_inbox(inbox, capacity = 2 ** 24):
+    return RingInbox(capacity = capacity) if inbox == 'ring' else None      # None gives the default queue served by the shared manager.
+
+def build(benchmark, inbox, num, received_at):
+    """
+    returns the actors of a benchmark, where the first is put messages and the last records when they are received
+    """
+    if benchmark == 'actor':
+        return [SupportingActor(receive = record, callback = done, inbox = make_inbox(inbox), received_at = received_at)]
+    if benchmark == 'cast':
+        return [SupportingCast(receive = record, callback = done, num = num, inbox = make_inbox(inbox), received_at = received_at)]
+    if benchmark == 'steal':
+        return [SupportingCast(receive = record, callback = done, num = num, inbox = make_inbox(inbox), steal = True, received_at = received_at)]
+    if benchmark == 'collector':
+        return [Collector(collect = collect, callback = done, inbox = make_inbox(inbox), received_at = received_at)]
+    if benchmark == 'relay':                                                # The relay of examples/6_relay.py.
+        last = Collector(collect = collect, callback = done, inbox = make_inbox(inbox), received_at = received_at)
+        middle = SupportingActor(receive = relay, callback = relay_cut, inbox = make_inbox(inbox), outbox = last.inbox)
+        first = SupportingActor(receive = relay, callback = relay_cut, inbox = make_inbox(inbox), outbox = middle.inbox)
+        return [first, middle, last]
+    if benchmark == 'startup':                                              # An actor for each message, put only the message with its own index.
+        return [SupportingActor(receive = record, callback = done, inbox = make_inbox(inbox, 2 ** 20), received_at = received_at)
+                for _ in xrange(num)]
+    raise ValueError("Unknown benchmark %s." %(benchmark))
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def run(benchmark, inbox, size, num, messages, results):
+    """
+    runs a benchmark and sends its results through the results connection
+    """
+    if benchmark == 'startup': messages = num                              # Each actor receives one message.
+    received_at = multiprocessing.RawArray('d', messages)                   # When each message is received, written by the actor receiving it.
+    sent_at = [0.] * messages
+    payload = 'x' * size
+
+    started = time.time()
+    actors = build(benchmark, inbox, num, received_at)
+    constructed = time.time()
+
+    actors[0].put((0, payload))                                             # The first message is waiting when reception starts.
+    called = time.time()
+    for actor in reversed(actors): actor()
+    put = time.time()
+    for i in xrange(1, messages):
+        sent_at[i] = time.time()
+        actors[i if benchmark == 'startup' else 0].put((i, payload))
+    for actor in (actors if benchmark == 'startup' else actors[:1]): actor.cut()
+    for actor in actors: actor.process.join()
+    finished = time.time()
+
+    latencies = [received_at[i] - sent_at[i] for i in xrange(1, messages)]
+    last_received = max(received_at)
+    results.send({'benchmark' : benchmark, 'inbox' : inbox, 'size' : size, 'num' : num, 'messages' : messages,
+                  'msgs_per_sec' : (messages - 1) / (last_received - put),
+                  'p50_latency_secs' : percentile(latencies, .5),
+                  'p99_latency_secs' : percentile(latencies, .99),
+                  'construct_secs' : constructed - started,
+                  'start_secs' : received_at[0] - called,
+                  'call_secs' : put - called,
+                  'cut_secs' : finished - last_received,
+                  'max_rss_kb' : resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss})
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Benchmarks of caine.')
+    parser.add_argument('--benchmarks', nargs = '+', default = _benchmarks, choices = _benchmarks)
+    parser.add_argument('--inboxes', nargs = '+', default = ['manager', 'ring'], choices = ['manager', 'ring'])
+    parser.add_argument('--sizes', nargs = '+', type = int, default = [16, 1024, 65536], help = 'bytes in each message')
+    parser.add_argument('--nums', nargs = '+', type = int, default = [1, 2, 4, 8], help = 'actors in each cast')
+    parser.add_argument('--messages', type = int, default = 10000, help = 'messages put in each benchmark')
+    parser.add_argument('--actors', type = int, default = 100, help = 'actors created by the startup benchmark')
+    parser.add_argument('--output', default = None, help = 'file the JSON results are written to, by default stdout')
+    args = parser.parse_args(argv)
+
+    results = []
+    for benchmark in args.benchmarks:
+        for inbox in args.inboxes:
+            for size in args.sizes:
+                for num in (args.nums if benchmark in ('cast', 'steal') else [args.actors] if benchmark == 'startup' else [1]):
+                    receiver, sender = multiprocessing.Pipe(False)
+                    process = multiprocessing.Process(target = run, args = [benchmark, inbox, size, num, args.messages, sender])
+                    process.start()                                         # Each benchmark has a process of its own, so that its peak memory is its own.
+                    results.append(receiver.recv())
+                    process.join()
+                    sys.stderr.write("%(benchmark)s inbox=%(inbox)s size=%(size)s num=%(num)s: %(msgs_per_sec).0f msgs/s\n" %(results[-1]))
+
+    report = {'python' : platform.python_version(), 'platform' : platform.platform(),
+              'cpu_count' : multiprocessing.cpu_count(), 'time' : time.time(), 'results' : results}
+    output = open(args.output, 'w') if args.output else sys.stdout
+    json.dump(report, output, indent = 2, sort_keys = True)
+    output.write('\n')
+    if args.output: output.close()
+
+if __name__ == '__main__':
+    main()
@@ -1 +1,6 @@
-from .caine import *
\ No newline at end of file
+from .caine import *
+from .inbox import *
+from .codec import *
+from .pipeline import *
+from .memo import *
+from .shared import *
@@ -1,8 +1,44 @@
 import multiprocessing
-import signal
 import time
 import functools
 import inspect
+import itertools
+import threading
+import collections
+import math
+import Queue
+import multiprocessing.pool
+import cPickle
+import ctypes
+import ctypes.util
+import sys
+import atexit
+import weakref
+import bisect
+import hashlib
+import importlib
+import cProfile
+import pstats
+import glob
+import os
+from .stats import Counters
+from .codec import CodecQueue
+from .inbox import RingInbox
+
+_wake_secs = .1 # The maximum number of seconds a process blocks waiting on a message or event before checking whether it should keep listening.
+_counter_rows = 64 # The number of actors of a SupportingCast running at once with separate runtime counters.
+_stream_maxsize = 16 # The maximum number of pieces of collected messages waiting to be streamed from a Collector.
+_started = weakref.WeakSet() # The inbox reception processes started, joined at interpreter exit.
+_replicas = 160 # The number of points on the hash ring of a keyed SupportingCast for each actor.
+_mailbox_maxsize = 1000 # The maximum number of messages or chunks waiting in the mailbox of each actor of a keyed SupportingCast.
+_local_capacity = 2 ** 22 # The number of bytes of shared memory of each local inbox of a SupportingCast stealing work.
+_steal_secs = .01 # The maximum number of seconds an idle actor of a SupportingCast stealing work waits on the inbox before trying to steal again.
+_broker = None # The multiprocessing.Manager serving the queues shared with processes, started when first needed.
+_broker_lock = threading.Lock() # Guards the start of the broker.
+_profile_ids = itertools.count() # Tell apart the profiles written by actors of the same process.
+_merged_profile = 'profile.prof' # The name of the file the profiles of the actors are merged into.
+_cpu_set_bits = 1024 # The number of CPUs a CPU affinity mask holds, as cpu_set_t does.
+_topology = '/sys/devices/system/cpu/cpu%s/topology/%s' # Where the socket and core of each CPU are found.
 
 class SupportingActor(object):
     """
@@ -10,23 +46,53 @@ class SupportingActor(object):
 
     Parameters
     __________
-    timeout : int or None, default None
-        If not None, the number of seconds between message receptions before callback is executed
+    timeout : float or None, default None
+        If not None, the number of seconds without messages to receive before callback is executed
     maxsize : int or None, default None
         If not None, the maximum size of the inbox
+    inbox : queue or None, default None
+        If not None, the inbox to use in place of a queue served by a multiprocessing.Manager shared by all actors, such as a caine.RingInbox
+    codec : caine.Codec or None, default None
+        If not None, the codec encoding messages put in the default inbox, and the collected messages of a caine.Collector
+    receive_batch : function or None, default None
+        If not None, called with a list of messages and the instance attributes in place of receive
+    max_batch : int, default 100
+        The maximum number of messages passed to receive_batch at once
+    max_latency : float, default .01
+        The maximum number of seconds spent gathering messages for receive_batch after the first arrives
+    report : function or None, default None
+        If not None, called with the result of stats every report_interval seconds while inbox reception is ongoing
+    report_interval : float, default 10.
+        The number of seconds between calls to report
+    profile : str or None, default None
+        If not None, the path of a directory in which each actor process writes a cProfile profile of its inbox reception loop, one file per process,
+        where time spent waiting on the inbox is under _next and time spent receiving messages under receive.
+        The profiles are merged into profile.prof in the directory once inbox reception is done, and profiles written by an earlier run are removed when it starts.
     kwargs : object
-        Additional keyword arguments are set as attributes
+        Additional keyword arguments are set as attributes, where large read-only attributes may be held by caine.share so that actors do not each hold a copy
     """
 
-    def __init__(self, timeout = None, maxsize = None, **kwargs):
-        self.inbox = multiprocessing.Manager().Queue(maxsize)           # Set up a task queue with maximum size that can be inserted into and read by multiple processes.
-        self.timeout = timeout                                          # The number of seconds before the process times out.
+    def __init__(self, timeout = None, maxsize = None, inbox = None, codec = None, **kwargs):
+        if inbox is None:                                               # If no inbox is given,
+            inbox = _manager().Queue(maxsize)                           # set up a task queue with maximum size that can be inserted into and read by multiple processes,
+            if codec is not None: inbox = CodecQueue(inbox, codec)      # with messages encoded by the codec if there is one.
+        self.inbox = inbox                                              # The inbox messages are received from.
+        self.codec = codec                                              # The codec encoding messages, if any.
+        self.timeout = timeout                                          # The number of seconds without messages before the process times out.
         self.receive = _receive                                         # The receive function, by default is the global private method _receive.
+        self.receive_batch = None                                       # The function receiving batches of messages, by default None so that messages are received one at a time.
+        self.max_batch = 100                                            # The maximum number of messages in a batch.
+        self.max_latency = .01                                          # The maximum number of seconds spent gathering a batch after its first message arrives.
         self.callback = _callback                                       # The callback function, by default is the global private method _callback.
         self.handle = _handle                                           # The handle function, by default is the global private method _handle.
+        self.report = None                                              # The function called periodically with runtime metrics, by default None.
+        self.report_interval = 10.                                      # The number of seconds between calls to report.
+        self.profile = None                                             # The directory profiles are written to, by default None so that actors are not profiled.
+        self._counters = Counters()                                     # Runtime counters in shared memory.
         self._process = None                                            # The private _process initially is None.
         self._running_flag = multiprocessing.Value('i', 0)              # A flag - 1 : inbox reception is ongoing, 0 : inbox reception ended naturally, -1 : inbox reception was cut immediately
         self._process_func = _listen_active                             # _listen_active is the target function of the inbox reception process.
+        self._directs = False                                           # Whether the inbox reception process directs actor processes of its own, rather than receiving messages itself.
         for nm, val in kwargs.iteritems(): setattr(self, nm, val)       # All other collected keyword arguments are set as attributes.
 
     @property
@@ -45,7 +111,12 @@ class SupportingActor(object):
 
     @property
     def _process_args(self):
-        return [self._running_flag, self.instance_attributes] # pass these arguments to _listen_active
+        return [self._running_flag, self.instance_attributes, None, self._counters] # pass these arguments to _listen_active
+
+    @property
+    def _target(self):
+        if self._directs: return self._process_func                                 # A process directing actors is not profiled, its actors are,
+        return _profiled(self._process_func, self.profile, 0, merge = True)        # otherwise the process is the only actor.
 
     @property
     def process(self):
@@ -53,7 +124,7 @@ class SupportingActor(object):
         multiprocessing.Process
         """
         if self._process is None:                                                                               # If _process is None,
-            self._process = multiprocessing.Process(target = self._process_func, args = self._process_args)     # set it as a multiprocessing.Process running _process_func and using the arguments _process_args
+            self._process = multiprocessing.Process(target = self._target, args = self._process_args)           # set it as a multiprocessing.Process running _process_func and using the arguments _process_args
         return self._process                                                                                    # return the private _process as public process.
     
     def cut(self, immediate = False):
@@ -68,17 +139,129 @@ class SupportingActor(object):
         if immediate: self._running_flag.value = -1     # Breaks inbox reception loop
         else: self.inbox.put(Cut)                       # Inbox processing terminates when inbox is empty
 
+    def put(self, message, ttl = None):
+        """
+        puts message in inbox, waiting whenever the inbox is full
+
+        Parameters
+        __________
+        message : object
+            The message
+        ttl : float or None, default None
+            If not None, the number of seconds after which the message is dropped, and counted as expired, if not yet taken from inbox
+        """
+        self._deliver(message if ttl is None else _Expiring(message, _deadline(ttl)))
+
+    def put_many(self, messages, chunksize = 1000, ttl = None):
+        """
+        puts messages in inbox in chunks, waiting whenever the inbox is full
+
+        Parameters
+        __________
+        messages : iterable
+            The messages to put in inbox, in order
+        chunksize : int, default 1000
+            The maximum number of messages put in inbox at once, each chunk counting once toward maxsize.
+            A chunk too large for an inbox of limited capacity, such as a caine.RingInbox, is put in smaller chunks.
+        ttl : float or None, default None
+            If not None, the number of seconds after which each chunk is dropped, and its messages counted as expired, if not yet taken from inbox
+        """
+        messages = iter(messages)                                                               # Get an iterator over the messages,
+        for chunk in iter(lambda: list(itertools.islice(messages, chunksize)), []):             # and for each chunk of at most chunksize of them,
+            self._deliver_chunk(chunk, _deadline(ttl))                                          # put the chunk in the inbox, waiting while the inbox is full.
+
+    def feed(self, messages, chunksize = 1000, cut = False, ttl = None):
+        """
+        puts messages in inbox in chunks from a separate thread, returning the thread
+
+        Parameters
+        __________
+        messages : iterable
+            The messages to put in inbox, in order, which may be a generator of any length
+        chunksize : int, default 1000
+            The maximum number of messages put in inbox at once, each chunk counting once toward maxsize
+        cut : boolean, default False
+            If True, cut inbox processing once all messages are put in inbox
+        ttl : float or None, default None
+            If not None, the number of seconds after which each chunk is dropped, and its messages counted as expired, if not yet taken from inbox
+        """
+        def _feed():
+            self.put_many(messages, chunksize, ttl)                                             # Put the messages in inbox,
+            if cut: self.cut()                                                                  # then cut inbox processing if appropriate.
+        feeder = threading.Thread(target = _feed)
+        feeder.start()
+        return feeder
+
     def __call__(self):
         """
         begin receiving messages put in inbox
         """
-        if self._process is not None:                           # If there is an ongoing private process,
+        if self._process is not None and self._process.is_alive():  # If there is an ongoing private process,
             print "Cutting existing process..."                 # notify the user that the existing process is being cut immediately,
             self.cut(immediate = True)                          # cut that process immediately,
-            while self._process.is_alive(): time.sleep(.1)      # wait for that process to die,
+            self._process.join()                                # wait for that process to die,
             print "Existing process has been cut."              # then notify the user that the existing process has been cut.
+        if hasattr(self.inbox, 'replay'): self.inbox.replay()   # Messages taken but not acknowledged when inbox reception last ended are received again,
+        if self.profile is not None: _clear_profiles(self.profile)  # and profiles written when it last ran are removed.
         self._process = None                                    # Set the private _process as None, such that a new multiprocessing.Process is generated when self.process is used,
         self.process.start()                                    # and start the new public process.
+        if isinstance(self._process, multiprocessing.Process): _started.add(self._process)  # Keep track of the process, so that it is waited for at exit.
+        if self.report is not None:                             # If there is a report function,
+            reporter = threading.Thread(target = _report, args = [self, self._process])  # call it from a separate thread while the process is alive.
+            reporter.daemon = True
+            reporter.start()
+
+    def join(self, timeout = None):
+        """
+        blocks until inbox reception is complete
+
+        Parameters
+        __________
+        timeout : float or None, default None
+            If not None, the maximum number of seconds to block
+        """
+        if self._process is not None: self._process.join(timeout)
+
+    def wait(self, timeout = None):
+        """
+        blocks until inbox reception is complete, returning True if it is not ongoing, otherwise False once timeout seconds passed
+
+        Parameters
+        __________
+        timeout : float or None, default None
+            If not None, the maximum number of seconds to block
+        """
+        self.join(timeout)
+        return self._process is None or not self._process.is_alive()
+
+    def _deliver(self, message):
+        self.inbox.put(message)
+
+    def _deliver_chunk(self, messages, deadline):
+        """
+        puts messages in inbox as a chunk, halving it until each half fits if it is too large for the inbox, so that no message taken from the caller is lost
+        """
+        try: self._deliver(_Chunk(messages, deadline))
+        except ValueError:                                                                      # A chunk is too large only before any of it is put,
+            if len(messages) == 1: raise                                                        # so unless it is a single message too large to put at all,
+            self._deliver_chunk(messages[:len(messages) // 2], deadline)                        # put each half in turn, in order.
+            self._deliver_chunk(messages[len(messages) // 2:], deadline)
+
+    def profile_stats(self):
+        """
+        pstats.Stats merging the profiles written by the actor processes, or None if not profiling or no profile was written yet
+        """
+        return _load_profiles(self.profile) if self.profile is not None else None
+
+    def stats(self):
+        """
+        dict of runtime metrics: the number of messages received, exceptions raised, messages dropped as expired, seconds spent receiving messages and waiting for them,
+        a histogram of seconds spent receiving each message as a list of upper bounds and counts, estimates of its median and 99th percentile,
+        and the depth of the inbox
+        """
+        stats = self._counters.summary()                        # Sum the counters in shared memory,
+        stats['depth'] = self.inbox.qsize()                     # and add the number of messages in the inbox.
+        return stats
 
 class SupportingCast(SupportingActor):
     """
@@ -86,20 +269,57 @@ class SupportingCast(SupportingActor):
 
     Parameters
     __________
-    timeout : int or None, default None
-        If not None, the number of seconds between message receptions before callback is executed
+    timeout : float or None, default None
+        If not None, the number of seconds without messages to receive before callback is executed
     num : int, default 1
         Number of actor processes
+    warm : int, default 0
+        Number of idle actor processes kept started, so that actors are added without starting processes
+    autoscale : caine.Autoscale or None, default None
+        If not None, the policy used to add and remove actors as the load changes
+    supervisor : caine.Supervisor or None, default None
+        The policy used to restart actors and dispose of messages on which exceptions were raised, by default caine.Supervisor()
+    key : function or None, default None
+        If not None, called with each message, returning a hashable key, so that messages with the same key are received in order by the same actor.
+        Each actor then has a mailbox of its own, and keys are assigned to listening actors by consistent hashing,
+        so that adding or removing actors moves only the keys of the actors added or removed.
+        Messages for a key that moves may be received out of order while the messages already in the mailbox it moved from are received.
+        If key raises an exception, it is passed to handle with actor_id None and the message is dropped.
+    steal : boolean, default False
+        If True, messages put by put, put_many and feed are spread in chunks across local inboxes in shared memory, one for each actor,
+        and actors with empty local inboxes steal from the local inboxes of other actors before taking messages from inbox,
+        so that actors rarely contend for the same inbox. There are as many local inboxes as num, or the max_actors of autoscale if larger,
+        and actors beyond that share local inboxes. If maxsize is given, or inbox has one, it is shared equally by the local inboxes, each holding at least one,
+        so that putting messages waits whenever the local inbox they are put in is full. Cut put in inbox is received once every local inbox is empty.
+    placement : caine.Placement or None, default None
+        If not None, the policy used to pin the directing process and actors to CPUs, where the CPUs each is pinned to are given by stats
     kwargs : object
         Additional keyword arguments are set as attributes
     """
-    def __init__(self, num = 1, **kwargs):
+    def __init__(self, num = 1, warm = 0, autoscale = None, supervisor = None, key = None, steal = False, placement = None, **kwargs):
+        if key is not None and steal: raise ValueError("A SupportingCast either routes messages by key or steals work, not both.")
         SupportingActor.__init__(self, **kwargs)                                        # Inherit the attributes, methods of SupportingActor.
+        self.warm = warm                                                                # The number of idle actor processes kept started.
+        self.autoscale = autoscale                                                      # The policy used to add and remove actors, if any.
+        self.supervisor = supervisor or Supervisor()                                    # The policy used to restart actors and dispose of messages on which exceptions were raised.
+        self.key = key                                                                  # The function returning the key messages are routed to actors by, if any.
+        self.local_inboxes = None                                                       # If stealing work, the local inbox of each actor.
+        if steal:
+            num_local = max(num, autoscale.max_actors if autoscale is not None else 0)
+            maxsize = kwargs.get('maxsize') or getattr(self.inbox, 'maxsize', None)     # The maximum size of the inbox, if any, is shared by the local inboxes.
+            self.local_inboxes = [RingInbox(max(maxsize // num_local, 1) if maxsize else None, _local_capacity, self.codec) for _ in xrange(num_local)]
+        self._turn = itertools.count()                                                  # Which local inbox messages are put in first, in turn.
+        self.placement = placement                                                      # The policy used to pin processes to CPUs, if any.
+        self._placed = _manager().dict() if placement is not None else None             # The CPUs the directing process and each actor were pinned to, by 'director' and actor_id.
         if 'handle' not in kwargs : self.handle = _handle_direct                        # By default, SupportingCast.handle is the global method _handle_direct.
         self._process_func = _direct                                                    # _direct is the target function of the inbox reception process.
+        self._directs = True                                                            # The directing process is not profiled, the actors it starts are.
         self._num_actor_to_add = multiprocessing.Value('i', num)                        # To start, there are num actors to add.
         self._num_actors_added = multiprocessing.Value('i', 0)                          # To start, zero actors have been added.
-        self._add = functools.partial(_add, num_actor_to_add = self._num_actor_to_add)  # This instance's _add method refers to the global method _add where the keyword argument num_actor_to_add refers to the instance's _num_actor_to_add
+        self._activity = multiprocessing.Event()                                        # Set to wake the directing process when actors should be added or removed or reception should end.
+        self._counters = Counters(_counter_rows)                                        # Runtime counters in shared memory, a row for each actor.
+        self._add = functools.partial(_add, num_actor_to_add = self._num_actor_to_add,  # This instance's _add method refers to the global method _add where the keyword argument num_actor_to_add refers to the instance's _num_actor_to_add
+                                      activity = self._activity)                        # and activity refers to the instance's _activity.
 
     @property
     def num(self):
@@ -127,9 +347,167 @@ class SupportingCast(SupportingActor):
         """
         self._add(num = -num)
 
+    def cut(self, immediate = False):
+        """
+        ends inbox processing
+
+        Parameters
+        __________
+        immediate : boolean, default False
+            If True, inbox processing is ended in place, otherwise inbox processing continues until queue is empty.
+        """
+        SupportingActor.cut(self, immediate = immediate)    # Cut as a SupportingActor would,
+        self._activity.set()                                # then wake the directing process so that it responds at once.
+
     @property
     def _process_args(self):
-        return [self._running_flag, self._num_actor_to_add, self._num_actors_added, self.instance_attributes] # pass these arguments to _direct
+        return [self._running_flag, self._num_actor_to_add, self._num_actors_added, self._activity, self.instance_attributes, self._counters, self._placed] # pass these arguments to _direct
+
+    def _deliver(self, message):
+        if self.local_inboxes is None: return self.inbox.put(message)
+        turn = next(self._turn) % len(self.local_inboxes)                               # Put the message in the local inbox with the fewest messages,
+        local_inboxes = self.local_inboxes[turn:] + self.local_inboxes[:turn]           # the first in turn on ties.
+        _put_local(min(local_inboxes, key = lambda local_inbox: local_inbox.qsize()), self.inbox, message)
+
+    def stats(self):
+        """
+        dict of runtime metrics as SupportingActor.stats, with the number of actors
+        and the metrics of each actor that received a message by actor_id, where actors beyond 64 running at once share metrics, given by None,
+        and if there is a placement policy, the CPUs the directing process and each actor started are pinned to by 'director' and actor_id
+        """
+        stats = SupportingActor.stats(self)
+        stats['depth'] += sum(local_inbox.qsize() for local_inbox in self.local_inboxes or [])     # Messages in local inboxes are waiting too.
+        stats['num'] = self.num
+        stats['actors'] = self._counters.by_actor()
+        if self._placed is not None: stats['placement'] = dict(self._placed)
+        return stats
+
+class Autoscale(object):
+    """
+    Policy evaluated by a caine.SupportingCast to add and remove actors as the load changes.
+    The number of actors wanted is the number needed to bring the inbox depth per actor to target_depth,
+    or the estimated latency of a message put in the inbox to target_latency, whichever is larger.
+
+    Parameters
+    __________
+    min_actors : int, default 1
+        The minimum number of actors, at least 1
+    max_actors : int, default multiprocessing.cpu_count()
+        The maximum number of actors
+    target_depth : float or None, default None
+        If not None, the number of messages waiting in the inbox per actor to aim for
+    target_latency : float or None, default None
+        If not None, the number of seconds between a message being put in the inbox and received to aim for
+    cooldown : float, default 5.
+        The minimum number of seconds between changes to the number of actors
+    interval : float, default 1.
+        The number of seconds between evaluations of the policy
+    """
+    def __init__(self, min_actors = 1, max_actors = None, target_depth = None, target_latency = None, cooldown = 5., interval = 1.):
+        if min_actors < 1: raise ValueError("min_actors must be at least 1.")
+        self.min_actors = min_actors
+        self.max_actors = max_actors or multiprocessing.cpu_count()
+        self.target_depth = target_depth
+        self.target_latency = target_latency
+        self.cooldown = cooldown
+        self.interval = interval
+        self._evaluated = None          # When the policy was last evaluated, and the number of messages received and seconds spent receiving them by then.
+        self._scaled = None             # When the number of actors was last changed.
+
+    def __call__(self, num, depth, received, busy_secs):
+        """
+        returns the number of actors to add, negative to remove, given the number of actors, the inbox depth,
+        and the number of messages received and seconds spent receiving them so far
+        """
+        now = time.time()
+        if self._evaluated is None or now - self._evaluated[0] < self.interval:                     # Wait for interval seconds of activity before evaluating the policy.
+            if self._evaluated is None: self._evaluated = (now, received, busy_secs)
+            return 0
+        (then, prior_received, prior_busy_secs) = self._evaluated
+        self._evaluated = (now, received, busy_secs)
+        if self._scaled is not None and now - self._scaled < self.cooldown: return 0                # Make no change while cooling down.
+        wanted = self.min_actors
+        if self.target_depth is not None:                                                           # Enough actors are wanted to bring the depth per actor to target_depth,
+            wanted = max(wanted, int(math.ceil(depth / float(self.target_depth))))
+        if self.target_latency is not None and received > prior_received:                           # and to bring the latency to target_latency, where the latency is
+            service_secs = (busy_secs - prior_busy_secs) / (received - prior_received)              # the seconds spent receiving a message
+            wait_secs = depth * (now - then) / (received - prior_received)                          # plus the seconds to receive every message ahead of it at the current rate.
+            wanted = max(wanted, int(math.ceil(num * (service_secs + wait_secs) / self.target_latency)))
+        elif self.target_latency is not None and depth == 0:                                        # With no messages received or waiting, only the minimum is wanted.
+            wanted = self.min_actors
+        elif self.target_latency is not None:                                                       # With messages waiting but none received, keep the actors there are.
+            wanted = max(wanted, num)
+        change = min(wanted, self.max_actors) - num
+        if change: self._scaled = now
+        return change
+
+class Supervisor(object):
+    """
+    Policy followed by a caine.SupportingCast when its actors raise exceptions or die.
+    An exception raised by receive is passed to handle while the actor that raised it, and every other actor, keeps listening.
+    An actor whose process dies is restarted after backing off, unless it was already restarted max_restarts times, in which case it is removed.
+
+    Parameters
+    __________
+    max_restarts : int, default 3
+        The maximum number of times each actor is restarted
+    backoff : float, default .1
+        The number of seconds before an actor is first restarted, doubling with each restart
+    max_backoff : float, default 10.
+        The maximum number of seconds before an actor is restarted
+    max_attempts : int, default 1
+        The number of times receive is attempted on a message before its exception is handled
+    dead_letters : queue or None, default None
+        If not None, a queue in which each message whose exception was handled is put with the exception
+    """
+    def __init__(self, max_restarts = 3, backoff = .1, max_backoff = 10., max_attempts = 1, dead_letters = None):
+        self.max_restarts = max_restarts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_attempts = max_attempts
+        self.dead_letters = dead_letters
+
+    def backoff_secs(self, restarts):
+        """
+        returns the number of seconds before restarting an actor already restarted the number of times given
+        """
+        return min(self.backoff * 2 ** restarts, self.max_backoff)
+
+class Placement(object):
+    """
+    Policy followed by a caine.SupportingCast to pin its directing process and actors to CPUs, where supported by the platform, such as Linux.
+    The cast uses at most budget of the CPUs given, chosen one from each socket in turn if spreading, otherwise filling each socket before the next,
+    and in either case one from each physical core before a second from any. The CPUs are chosen when the policy is created.
+
+    Parameters
+    __________
+    cpus : list of int or None, default None
+        If not None, the CPUs the cast may use, otherwise those the creating process may run on
+    budget : int or None, default None
+        If not None, the maximum number of CPUs the cast uses
+    spread : boolean, default True
+        If True, the CPUs used are spread across sockets, otherwise packed on as few sockets as possible
+    exclusive : boolean, default True
+        If True, each actor is pinned to one of the CPUs used, in turn by actor_id, otherwise each actor may run on any of them
+    director : list of int or None, default None
+        If not None, the CPUs the directing process is pinned to, otherwise the CPUs used
+    """
+    def __init__(self, cpus = None, budget = None, spread = True, exclusive = True, director = None):
+        allowed = _get_affinity()
+        if cpus is not None and not set(cpus) <= set(allowed):
+            raise ValueError("CPUs %s are not available to this process." %(sorted(set(cpus) - set(allowed))))
+        if budget is not None and budget < 1: raise ValueError("budget must be at least 1.")
+        self.cpus = _order_cpus(allowed if cpus is None else sorted(set(cpus)), spread)[:budget]   # The CPUs used, in the order actors are pinned to them.
+        self.budget = budget
+        self.spread = spread
+        self.exclusive = exclusive
+        self.director = sorted(director) if director is not None else list(self.cpus)
+
+    def actor_cpus(self, actor_id):
+        """
+        returns the CPUs the actor with the id given is pinned to
+        """
+        return [self.cpus[actor_id % len(self.cpus)]] if self.exclusive else list(self.cpus)
 
 class Collector(SupportingActor):
     """
@@ -138,30 +516,165 @@ class Collector(SupportingActor):
 
     Parameters
     __________
-    timeout : int or None, default None
-        If not None, the number of seconds between message receptions before callback is executed
+    timeout : float or None, default None
+        If not None, the number of seconds without messages to receive before callback is executed
+    collect_batch : function or None, default None
+        If not None, called with a list of messages, the previously collected messages and the instance attributes in place of collect
+    stream_every : int or None, default None
+        If not None, the collected messages are emitted to Collector.stream after every stream_every messages
+    stream_interval : float or None, default None
+        If not None, the collected messages are emitted to Collector.stream every stream_interval seconds while messages arrive
+    stream_delta : boolean, default False
+        If True, collection starts over from None after each emission, so that each emits only what was collected since the last,
+        in which case Collector.collected is None, as what was collected is only held by the emissions
+    stream_chunk_bytes : int, default 1048576
+        The maximum number of bytes of pickled collected messages handed over at once
     kwargs : object
         Additional keyword arguments are set as attributes
     """
     def __init__(self, **kwargs):
         self.collect = _collect                                 # By default, Collector.collect is the global method _collect
+        self.collect_batch = None                               # By default, messages are collected one at a time.
+        self.stream_every = None                                # By default, collected messages are not streamed.
+        self.stream_interval = None
+        self.stream_delta = False                               # By default, each emission holds all messages collected so far.
+        self.stream_chunk_bytes = 2 ** 20                       # The maximum size of each piece of collected messages streamed.
         SupportingActor.__init__(self, **kwargs)                # Inherit the attributes, methods of SupportingActor.
-        self._outbox = multiprocessing.Manager().Queue(1)       # A queue of maximum size 1 is used to receive collected messages upon completion.
+        manager = _manager()
+        self._outbox = manager.Queue(1)                         # A queue of maximum size 1 is used to receive collected messages upon completion,
+        if self.codec is not None: self._outbox = CodecQueue(self._outbox, self.codec)  # encoded by the codec if there is one.
+        self._stream = None                                     # If collected messages are streamed, a bounded queue of pieces of them, so that collection waits on slow consumers.
+        if self.stream_every or self.stream_interval: self._stream = manager.Queue(_stream_maxsize)
         self._collected = None                                  # There are no collected messages to start.
 
     @property
     def _process_args(self):
-        return [self._running_flag, self.instance_attributes, self._outbox] # pass these arguments to _listen_active
+        return [self._running_flag, self.instance_attributes, self._outbox, self._counters, self._stream] # pass these arguments to _listen_active
+
+    def stream(self):
+        """
+        yields collected messages as they are emitted while inbox processing is ongoing, then the final collected messages,
+        which become Collector.collected unless stream_delta is True.
+        Emissions must be consumed, as collection waits while too many are waiting.
+        """
+        if self._stream is None: raise ValueError("Streaming requires stream_every or stream_interval.")
+        pieces = {}                                                                 # The pieces of emissions received so far, by the id of the process emitting them.
+        last = None                                                                 # The last emission, which holds all collected messages once the stream ends, unless emitting deltas.
+        while True:
+            try: piece = self._stream.get(True, _wake_secs)                         # Wait for the next piece,
+            except Queue.Empty:                                                     # ending once the inbox reception process dies without ending the stream.
+                if self._process is not None and not self._process.is_alive() and self._stream.empty(): return
+                continue
+            if piece is Cut:                                                        # Cut ends the stream,
+                if not self.stream_delta: self._collected = last                    # after which the last emission holds all collected messages.
+                return
+            actor_id, more, data = piece
+            pieces.setdefault(actor_id, []).append(data)
+            if not more:                                                            # Once the last piece of an emission arrives, yield it.
+                last = _loads(''.join(pieces.pop(actor_id)), self.codec)
+                yield last
 
     @property
     def collected(self):
         """
-        all collected messages if inbox processing is complete, otherwise None
+        all collected messages if inbox processing is complete, otherwise None.
+        If streaming, the final collected messages yielded by Collector.stream, or None if stream_delta is True.
         """
         if not self._outbox.empty():                # If there's data in the outbox,
-            self._collected = self._outbox.get()    # overwrite the private attribute using the data in the outbox,
+            collected = self._outbox.get()
+            if collected is not Cut: self._collected = collected    # overwrite the private attribute using the data in the outbox, unless it marks that they were streamed instead,
         return self._collected                      # return the private attribute holding the collected messages.
 
+class ParallelCollector(Collector):
+    """
+    Data structure with operations for collecting objects put in its inbox using multiple processes, each collecting some of the messages.
+    Once inbox processing is complete, the collected messages of each process are combined in pairs, in parallel, until one remains.
+    Collector.stream yields what each process collected as it is emitted, then the combination.
+
+    Parameters
+    __________
+    num : int, default 2
+        Number of collecting processes
+    combine : function
+        Called with the messages collected by two processes, returning their combination.
+        As messages reach processes in no particular order, collect and combine should give the same result whatever the order.
+    kwargs : object
+        Additional keyword arguments are set as attributes
+    """
+    def __init__(self, num = 2, **kwargs):
+        self.combine = _combine                                 # By default, ParallelCollector.combine is the global method _combine
+        Collector.__init__(self, **kwargs)                      # Inherit the attributes, methods of Collector.
+        self.num = num                                          # The number of collecting processes.
+        self._counters = Counters(_counter_rows)                # Runtime counters in shared memory, a row for each collecting process.
+        self._process_func = _collect_parallel                  # _collect_parallel is the target function of the inbox reception process.
+        self._directs = True                                    # The collecting processes it starts are profiled rather than the inbox reception process.
+
+    def stats(self):
+        """
+        dict of runtime metrics as SupportingActor.stats, with the number of collecting processes
+        and the metrics of each that received a message by actor_id
+        """
+        stats = SupportingActor.stats(self)
+        stats['actors'] = self._counters.by_actor()
+        return stats
+
+class ThreadActor(SupportingActor):
+    """
+    Data structure with operations for receiving objects put in its inbox using a thread rather than a process.
+    By default, its inbox is a Queue.Queue shared by threads of the process that created it.
+
+    Parameters
+    __________
+    maxsize : int or None, default None
+        If not None, the maximum size of the inbox
+    kwargs : object
+        Additional keyword arguments are set as attributes
+    """
+    def __init__(self, maxsize = None, inbox = None, **kwargs):
+        if inbox is None: inbox = Queue.Queue(maxsize)                                      # If no inbox is given, set up a task queue shared by threads.
+        super(ThreadActor, self).__init__(maxsize = maxsize, inbox = inbox, **kwargs)       # Inherit the attributes, methods of the next class in the method resolution order.
+
+    @property
+    def process(self):
+        """
+        threading.Thread
+        """
+        if self._process is None:                                                                               # If _process is None,
+            self._process = threading.Thread(target = self._target, args = self._process_args)                 # set it as a threading.Thread running _process_func and using the arguments _process_args
+        return self._process                                                                                    # return the private _process as public process.
+
+class ThreadCast(ThreadActor, SupportingCast):
+    """
+    Data structure with operations for receiving objects put in its inbox using multiple caine.ThreadActor threads
+
+    Parameters
+    __________
+    num : int, default 1
+        Number of actor threads
+    kwargs : object
+        Additional keyword arguments are set as attributes
+    """
+    def __init__(self, **kwargs):
+        super(ThreadCast, self).__init__(**kwargs)                                          # Inherit the attributes, methods of ThreadActor and SupportingCast.
+        self._process_func = functools.partial(_direct, worker = threading.Thread)          # _direct is the target function of the inbox reception thread, casting actors as threads.
+
+class AsyncActor(SupportingActor):
+    """
+    Data structure with operations for receiving objects put in its inbox with many messages received at once by threads of one process.
+    Messages are taken from the inbox only while fewer than concurrency are being received, and callback is executed once all have been received.
+
+    Parameters
+    __________
+    concurrency : int, default 100
+        The maximum number of messages received at once
+    kwargs : object
+        Additional keyword arguments are set as attributes
+    """
+    def __init__(self, concurrency = 100, **kwargs):
+        SupportingActor.__init__(self, **kwargs)                # Inherit the attributes, methods of SupportingActor.
+        self.concurrency = concurrency                          # The maximum number of messages received at once.
+        self._process_func = _listen_async                      # _listen_async is the target function of the inbox reception process.
+
 class Cut:
     """
     shuts down inbox reception when put in inbox of SupportingActor or SupportingCast instance
@@ -187,179 +700,968 @@ def _handle(exc, message, instance_attributes):
     print message
     raise exc
 
-def _timeout(signum, frame, running_flag):
+def preload(*modules):
     """
-    shuts off the running_flag value, ending inbox reception
+    imports modules, such as those defining receive functions, and starts the manager serving the default inboxes of actors,
+    so that actors created afterwards do not wait for it to start, and their processes start with the modules already imported
+
+    Parameters
+    __________
+    modules : str
+        The names of the modules to import
+    """
+    for module in modules: importlib.import_module(module)
+    _manager()
+
+def _manager():
+    """
+    returns the multiprocessing.Manager serving queues shared with processes, starting it if it is not yet started.
+    Processes forked once it is started use it too.
+    """
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = multiprocessing.Manager()
+        return _broker
+
+def _monotonic_clock():
+    """
+    returns a function giving seconds on a clock that never goes back, CLOCK_MONOTONIC where available, otherwise time.time
     """
-    running_flag.value = 0
+    clock_id = {'linux' : 1, 'darwin' : 6}.get(sys.platform.rstrip('0123456789'))      # The id of CLOCK_MONOTONIC on the platform, if known.
+    try:
+        clock_gettime = ctypes.CDLL(ctypes.util.find_library('rt') or ctypes.util.find_library('c')).clock_gettime
+    except (OSError, AttributeError):
+        clock_id = None
+    if clock_id is None: return time.time
+    class timespec(ctypes.Structure):
+        _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+    def monotonic():
+        now = timespec()
+        clock_gettime(clock_id, ctypes.byref(now))
+        return now.tv_sec + now.tv_nsec * 1e-9
+    return monotonic
+
+_monotonic = _monotonic_clock() # Timeouts and deadlines are measured on this clock, which is shared by the processes of a machine.
 
-def _listen_active(running_flag, instance_attributes, collect_outbox = None):
+def _deadline(secs):
+    """
+    returns the time on the monotonic clock secs seconds from now, or None if secs is None
+    """
+    return _monotonic() + secs if secs is not None else None
+
+def _listen_async(running_flag, instance_attributes, collect_outbox = None, counters = None, stream = None):
+    """
+    listens for incoming messages as _listen_active does, receiving up to concurrency messages at once in a pool of threads
+    """
+    pool = multiprocessing.pool.ThreadPool(instance_attributes['concurrency'])      # The threads receiving messages.
+    slots = threading.BoundedSemaphore(instance_attributes['concurrency'])          # Held while a message is being received.
+    failures = []                                                                   # Exceptions raised by handle, to be raised by the listening process.
+    batch = instance_attributes['receive_batch'] is not None                        # Whether batches of messages are received.
+    receive = instance_attributes['receive_batch' if batch else 'receive']          # The function receiving messages.
+    callback = instance_attributes['callback']                                      # The function executed when inbox reception is done.
+    counting = threading.Lock()                                                     # Held while counting, as threads share a row of counters.
+    expired = functools.partial(_count_expired, counters, 0)                        # Messages dropped as expired are counted by the listening process.
+
+    def _receive(message):
+        started = time.time()
+        try:
+            new_attrs = receive(message, instance_attributes)                       # Execute the receive function on the message and the instance attributes.
+            if type(new_attrs) is dict: instance_attributes.update(new_attrs)       # If receive returns any new attributes, update the instance attributes.
+            errors = 0
+        except Exception as exc:                                                    # If an exception is raised, pass it, the message, and the instance atributes to handle.
+            errors = 1
+            try: instance_attributes['handle'](exc, message, instance_attributes)
+            except Exception as exc: failures.append(exc)                           # If handle raises, keep the exception for the listening process.
+        finally: slots.release()                                                    # Free the slot held for the message.
+        with counting: counters.record(0, len(message) if batch else 1, time.time() - started, 0, errors)
+
+    def _dispatch(message, instance_attributes):
+        slots.acquire()                                                             # Wait for a free slot,
+        pool.apply_async(_receive, [message])                                       # then receive the message in the pool.
+
+    def _finish(instance_attributes):
+        for slot in xrange(instance_attributes['concurrency']): slots.acquire()     # Once inbox reception is done, wait for all messages to be received,
+        pool.close()                                                                # leaving the idle threads of the pool to exit with the process,
+        callback(instance_attributes)                                               # then execute the callback.
+
+    instance_attributes['receive_batch' if batch else 'receive'] = _dispatch
+    instance_attributes['callback'] = _finish
+    try: _listen_active(running_flag, instance_attributes, expired = expired, failures = failures)    # The messages are counted as they are received, not as they are dispatched.
+    except:                                                                         # If inbox reception ended on an exception raised by handle,
+        for slot in xrange(instance_attributes['concurrency']): slots.acquire()     # let the messages already dispatched be received before raising it.
+        raise
+
+def _listen_active(running_flag, instance_attributes, collect_outbox = None, counters = None, stream = None, expired = None, failures = None):
     """
     listens for incoming messages, executes callback when inbox reception complete, executes handle when exception raised
+    expired - called with the number of messages dropped as expired, by default counting them in counters
+    failures - if not None, a list of exceptions raised by handle in other threads, the first of which ends inbox reception and is raised
     """
     running_flag.value = 1                                  # Flag inbox reception as ongoing.
     if collect_outbox is not None:                          # If collect_outbox is not None,
         prior_collected = None                              # previously collected messages are None,
         instance_attributes['collected'] = None             # and the collected attribute is None.
     
-    # Use a timeout if timeout is an integer, otherwise do not.
-    # If a timeout is being used, set an alarm to run _timeout after timeout seconds.
-    use_timeout = True if type(instance_attributes['timeout']) == int else False
-    if use_timeout: 
-        signal.signal(signal.SIGALRM, functools.partial(_timeout, running_flag = running_flag))
-        signal.alarm(instance_attributes['timeout'])
+    timeout = instance_attributes['timeout']                # If there is a timeout,
+    idle_deadline = _deadline(timeout)                      # inbox reception ends once no message arrives before this deadline.
+             
+    inbox = instance_attributes['inbox']                                                                            # The inbox messages are received from.
+    batch_func = instance_attributes.get('collect_batch' if collect_outbox is not None else 'receive_batch')        # The function receiving batches of messages, if any.
+    max_batch = instance_attributes['max_batch'] if batch_func is not None else 1                                   # Messages are gathered in batches of at most max_batch when receiving batches, otherwise one at a time.
+    pending = collections.deque()                                                                                   # Messages from chunks taken from the inbox that are yet to be received.
+    idle_since = time.time()                                                                                        # When the listening process last started waiting for messages.
+    actor_id = instance_attributes.get('actor_id', 0)                                                               # The id emissions to stream are tagged with,
+    row = instance_attributes.get('counter_row', 0)                                                                 # and the row of counters.
+    unstreamed, streamed_at = 0, time.time()                                                                        # The number of messages collected since the last emission, and when it was.
+    if expired is None and counters is not None: expired = functools.partial(_count_expired, counters, row)        # Count messages dropped as expired.
              
     while running_flag.value == 1:                                                                                  # While the listening process is ongoing:
         
+        if failures: break                                                                                          # If handle raised in another thread, take no more messages.
+        if stream is not None and unstreamed and _stream_due(instance_attributes, unstreamed, streamed_at):         # If collected messages are due to be streamed,
+            _emit(stream, actor_id, prior_collected, instance_attributes)                                           # emit them,
+            if instance_attributes['stream_delta']: prior_collected = None                                          # start collection over if only what was collected since is to be emitted next,
+            unstreamed, streamed_at = 0, time.time()                                                                # and note the emission.
         try:                                                                                                        # Try
-            message = instance_attributes['inbox'].get_nowait()                                                     # to get a message immediately.
-            if message is Cut:                                                                                      # If message is attribute Cut,
-                running_flag.value = 0                                                                              # flag inbox reception as not ongoing
-                break                                                                                               # and break the listening process                                                                                    
-            if use_timeout: signal.alarm(0)                                                                         # Alarm turned off while running receive on message
-        except:                                                                                                     # If any of the above fails
-            continue                                                                                                # start the while loop again to ensure that the listening process should continue.
+            message = _next(inbox, pending, _wait_secs(idle_deadline), expired)                                     # to get a message, blocking for at most _wake_secs seconds or until the timeout.
+        except Queue.Empty:                                                                                         # If no message arrived in that time
+            if idle_deadline is not None and _monotonic() >= idle_deadline: running_flag.value = 0                  # end inbox reception if it timed out,
+            continue                                                                                                # and start the while loop again to ensure that the listening process should continue.
+        messages, cut = _get_batch(inbox, pending, message, max_batch, instance_attributes['max_latency'], expired) # Gather the messages to receive and whether Cut was among them.
+        if running_flag.value != 1:                                                                                 # If inbox reception ended while waiting,
+            _put_back(inbox, messages + list(pending), cut)                                                         # return the messages, and those pending, to the inbox unprocessed
+            pending.clear()
+            break                                                                                                   # and break the listening process.
+        
+        if messages:                                                                                                # If there are non-Cut messages,
+            message = messages if batch_func is not None else messages[0]                                           # A batch is received as a list, otherwise the single message is received.
+            started = time.time()                                                                                   # Note when receiving started.
+            errors = 0
+            try:                                                                                                    
+                if collect_outbox is not None:                                                                      # If there is an outbox to collect messages,
+                    collect = batch_func if batch_func is not None else instance_attributes['collect']              # try executing the collect function
+                    prior_collected = collect(message, prior_collected, instance_attributes)                        # on the message, the previously collected messages and the instance attributes
+                else:                                                                                               # otherwise,
+                    receive = batch_func if batch_func is not None else instance_attributes['receive']              # execute the receive function
+                    new_attrs = receive(message, instance_attributes)                                               # on the message and the instance attributes.
+                    if type(new_attrs) is dict: instance_attributes.update(new_attrs)                               # If receive returns any new attributes, update the instance attributes.
+            except Exception as exc:                                                                                # If an exception is raised,
+                errors = 1                                                                                          # count it,
+                instance_attributes['handle'](exc, message, instance_attributes)                                    # and pass it, the message, and the instance atributes to handle.
+            finally:
+                if counters is not None:                                                                            # Count the messages received, the seconds spent receiving and waiting for them, and any exception.
+                    counters.record(row, len(messages), time.time() - started, started - idle_since, errors)
+                idle_since = time.time()
+                idle_deadline = _deadline(timeout)                                                                  # Time spent receiving does not count toward the timeout.
+                unstreamed += len(messages)
+                if collect_outbox is None: _acknowledge(inbox, pending)                                             # Messages received are acknowledged, collected messages once collection is done.
         
-        try:                                                                                                        # With a non-Cut message,
-            if collect_outbox is not None:                                                                          # if there is an outbox to collect messages,
-                prior_collected = instance_attributes['collect'](message, prior_collected, instance_attributes)     # try executing the collect function on the message, the previously collected messages and the instance attributes
-            else:                                                                                                   # otherwise,
-                new_attrs = instance_attributes['receive'](message, instance_attributes)                            # execute the receive function on the message and the instance attributes.
-                if type(new_attrs) is dict: actor_attributes.update(new_attrs)                                      # If receive returns any new attributes, update the instance attributes.
-            if use_timeout : signal.alarm(instance_attributes['timeout'])                                           # if successful, reset the alarm if appropriate. 
-        except Exception as exc: instance_attributes['handle'](exc, message, instance_attributes)                   # If an exception is raised, pass it, the message, and the instance atributes to handle.
+        if cut:                                                                                                     # If message is attribute Cut,
+            running_flag.value = 0                                                                                  # flag inbox reception as not ongoing
+            break                                                                                                   # and break the listening process.
+    _put_back(inbox, pending, False)                                                                                # Return any messages from chunks that were not received to the inbox.
+    if failures: raise failures[0]                                                                                  # Raise the exception handle raised in another thread, as if raised here.
     
     if running_flag.value != -1:                                                                                    # If running_flag does not have a value of -1 indicating the process was not cut immediately,
         if collect_outbox is not None:                                                                              # If collect_outbox is not None,
-            collect_outbox.put(prior_collected)                                                                     # put the previously collected messages in the outbox,
+            streamed = stream is not None and not isinstance(collect_outbox, _Combiner)                             # If streaming, the collected messages are handed over by the stream,
+            collect_outbox.put(Cut if streamed else prior_collected)                                                # so mark that in the outbox, otherwise put the previously collected messages in it,
+            _acknowledge(inbox, pending)                                                                            # acknowledge the messages collected,
             instance_attributes['collected'] = prior_collected                                                      # and set the collected attribute as prior_collected.
+            if streamed:                                                                                            # If streaming, and not collecting for a ParallelCollector which streams the combination,
+                _emit_last(stream, actor_id, prior_collected, instance_attributes)                                  # emit the collected messages and end the stream.
         instance_attributes['callback'](instance_attributes)                                                        # Execute callback.
 
+def _collect_parallel(running_flag, instance_attributes, collect_outbox, counters, stream = None):
+    """
+    starts processes collecting messages as _listen_active does, combining what each collects in a tree,
+    executes callback with the combination when inbox reception complete
+    """
+    running_flag.value = 1                                                                  # Flag inbox reception as ongoing.
+    num = instance_attributes['num']
+    counters.release_all()                                                                  # Counters of an earlier run are kept as those of retired processes.
+    flags = [multiprocessing.Value('i', 0) for worker_id in xrange(num)]                    # The running flag of each collecting process.
+    pipes = [multiprocessing.Pipe(False) for worker_id in xrange(num)]                      # Each process sends what it has combined to its parent in the tree through a pipe,
+    workers = []                                                                            # where the parent of process 0 is this process.
+    for worker_id in xrange(num):
+        children = [pipes[worker_id + 2 ** level][0] for level in _levels(worker_id, num)]  # The process combines what it collected with what its children combined,
+        combiner = _Combiner(instance_attributes['inbox'], flags[worker_id], instance_attributes['combine'], children, pipes[worker_id][1])
+        worker_attributes = dict(instance_attributes, actor_id = worker_id, counter_row = counters.claim(worker_id), callback = lambda instance_attributes: None)
+        workers.append(multiprocessing.Process(target = _profiled(_listen_active, instance_attributes['profile'], worker_id), args = [flags[worker_id], worker_attributes, combiner, counters, stream]))
+        workers[-1].start()
+
+    while not pipes[0][0].poll(_wake_secs):                                                 # Wait for the combination of all collected messages.
+        failed = any(worker.exitcode not in (None, 0) for worker in workers)                # If a collecting process died,
+        if running_flag.value == -1 or failed:                                              # or inbox reception was cut immediately,
+            for flag in flags: flag.value = -1                                              # cut every collecting process immediately
+            for worker in workers: worker.join()                                            # and end without executing callback.
+            _merge_profiles(instance_attributes['profile'])
+            return
+    collected = pipes[0][0].recv()
+    for worker in workers: worker.join()
+    _merge_profiles(instance_attributes['profile'])                                         # Merge the profiles of the collecting processes, if profiling.
+
+    _drop_cuts(instance_attributes['inbox'])                                                # Each collecting process passes Cut on to the others, so remove it from the inbox.
+    running_flag.value = 0                                                                  # Flag inbox reception as not ongoing.
+    if stream is not None: _emit_last(stream, None, collected, instance_attributes)         # If streaming, emit the combination and end the stream.
+    collect_outbox.put(Cut if stream is not None else collected)                            # Put the collected messages in the outbox, or mark that they were streamed,
+    instance_attributes['collected'] = collected                                            # set the collected attribute,
+    instance_attributes['callback'](instance_attributes)                                    # and execute callback.
+
+def _stream_due(instance_attributes, unstreamed, streamed_at):
+    """
+    True if collected messages are due to be emitted, given the number of messages collected and when collected messages were emitted since
+    """
+    every, interval = instance_attributes['stream_every'], instance_attributes['stream_interval']
+    return bool((every and unstreamed >= every) or (interval and time.time() - streamed_at >= interval))
+
+def _emit(stream, actor_id, collected, instance_attributes):
+    """
+    puts collected messages, pickled or encoded by the codec, in stream in pieces of at most stream_chunk_bytes tagged with actor_id and whether more pieces follow
+    """
+    codec, chunk_bytes = instance_attributes['codec'], instance_attributes['stream_chunk_bytes']
+    payload = codec.dumps(collected) if codec is not None else cPickle.dumps(collected, cPickle.HIGHEST_PROTOCOL)
+    for start in xrange(0, len(payload), chunk_bytes):
+        stream.put((actor_id, start + chunk_bytes < len(payload), payload[start:start + chunk_bytes]))
+
+def _emit_last(stream, actor_id, collected, instance_attributes):
+    """
+    emits the collected messages once inbox reception is complete, unless only what was collected since the last emission is emitted and that is nothing, then ends stream
+    """
+    if not (instance_attributes['stream_delta'] and collected is None):
+        _emit(stream, actor_id, collected, instance_attributes)
+    stream.put(Cut)
+
+def _loads(payload, codec):
+    """
+    returns the collected messages emitted by _emit
+    """
+    return codec.loads(payload) if codec is not None else cPickle.loads(payload)
+
+def _levels(worker_id, num):
+    """
+    yields each level of the tree at which the collecting process with worker_id combines what it has with process worker_id + 2 ** level
+    """
+    level = 0
+    while worker_id % 2 ** (level + 1) == 0 and worker_id + 2 ** level < num:
+        yield level
+        level += 1
+
+class _Combiner(object):
+    """
+    takes the place of the outbox of a collecting process of a ParallelCollector, combining what it collected with what its children in the tree combined
+    """
+    def __init__(self, inbox, running_flag, combine, children, parent):
+        self.inbox = inbox
+        self.running_flag = running_flag
+        self.combine = combine
+        self.children = children
+        self.parent = parent
+
+    def put(self, collected):
+        self.inbox.put(Cut)                                                                 # Pass Cut on to the other collecting processes.
+        for child in self.children:                                                         # For each child, from the nearest,
+            while not child.poll(_wake_secs):                                               # wait for what it combined,
+                if self.running_flag.value == -1: return                                    # unless cut immediately,
+            partial = child.recv()                                                          # and combine it with what was collected.
+            if collected is None: collected = partial
+            elif partial is not None: collected = self.combine(collected, partial)
+        self.parent.send(collected)                                                         # Send the combination to the parent.
+
+class _Chunk(object):
+    """
+    holds messages put in an inbox at once by SupportingActor.put_many, and the deadline on the monotonic clock after which they are dropped, if any
+    """
+    def __init__(self, messages, deadline = None):
+        self.messages = messages
+        self.deadline = deadline
+
+class _Expiring(object):
+    """
+    holds a message put in an inbox by SupportingActor.put, and the deadline on the monotonic clock after which it is dropped
+    """
+    def __init__(self, message, deadline):
+        self.message = message
+        self.deadline = deadline
+
+def _next(inbox, pending, timeout, expired = None):
+    """
+    returns the next pending message, otherwise the next message in the inbox within timeout seconds, unpacking chunks into pending,
+    and dropping messages past their deadline, calling expired with the number of messages dropped
+    """
+    while not pending:                                                      # While no messages are pending,
+        message = inbox.get(True, timeout)                                  # get the next one from the inbox.
+        if type(message) is _Chunk:                                         # If it is a chunk, the messages it holds are pending unless expired,
+            if not _expire(message, len(message.messages), expired): pending.extend(message.messages)
+        elif type(message) is _Expiring:                                    # if it holds a message with a deadline, return the message unless expired,
+            if not _expire(message, 1, expired): return message.message
+        else: return message                                                # otherwise return it.
+    return pending.popleft()                                                # Return the next pending message.
+
+def _expire(holder, num, expired):
+    """
+    True if the deadline of a chunk or message holder has passed, calling expired with the number of messages it holds
+    """
+    if holder.deadline is None or _monotonic() < holder.deadline: return False
+    if expired is not None: expired(num)
+    return True
+
+def _count_expired(counters, row, num):
+    """
+    counts num messages dropped as expired in the row of counters given
+    """
+    counters.record(row, 0, 0., 0., expired = num)
+
+def _wait_secs(deadline):
+    """
+    returns the number of seconds to block waiting for a message, at most _wake_secs and at most until deadline
+    """
+    return _wake_secs if deadline is None else max(0., min(_wake_secs, deadline - _monotonic()))
+
+def _get_batch(inbox, pending, message, max_batch, max_latency, expired = None):
+    """
+    returns a list of at most max_batch messages starting with message, gathered for at most max_latency seconds, and whether Cut was received
+    """
+    if message is Cut: return [], True                                      # If the first message is Cut, there is nothing to receive.
+    messages = [message]                                                    # Otherwise the batch starts with the message.
+    deadline = time.time() + max_latency                                    # Stop gathering messages from the inbox at the deadline,
+    while len(messages) < max_batch:                                        # or once the batch is full.
+        remaining = deadline - time.time()
+        if remaining <= 0 and not pending: break
+        try: message = _next(inbox, pending, max(remaining, 0), expired)    # Take the next pending message, or wait for the next message until the deadline.
+        except Queue.Empty: break
+        if message is Cut: return messages, True                            # If it is Cut, stop gathering.
+        messages.append(message)
+    return messages, False
+
+def _put_back(inbox, messages, cut):
+    """
+    returns messages, the last taken from the inbox by this thread in the order they were taken, and Cut if it was received, to the inbox
+    """
+    if hasattr(inbox, 'put_back'): inbox.put_back(messages)                 # An inbox noting where messages were taken from, such as a PriorityInbox, returns them there,
+    else:                                                                   # otherwise they are put again.
+        for message in messages: inbox.put(message)
+    if cut: inbox.put(Cut)
+    _acknowledge(inbox, ())                                                 # The messages returned replace those taken.
+
+def _acknowledge(inbox, pending):
+    """
+    acknowledges the messages taken from inbox by this thread if it acknowledges messages and none are pending
+    """
+    if not pending and hasattr(inbox, 'ack'): inbox.ack()
+
+def _drop_cuts(inbox):
+    """
+    removes Cut, passed on by the actors of a cast once inbox reception is complete, from the inbox, returning any other messages to it in order
+    """
+    _put_back(inbox, _taken(inbox), False)
+
+class _HashRing(object):
+    """
+    consistent hash ring of actor ids, each placed at _replicas points, so that adding or removing an actor moves only the keys nearest its points
+    """
+    def __init__(self, actor_ids):
+        self.actor_ids = frozenset(actor_ids)
+        points = sorted((_point('%s:%s' %(actor_id, replica)), actor_id) for actor_id in self.actor_ids for replica in xrange(_replicas))
+        self._points = [point for point, _ in points]
+        self._owners = [actor_id for _, actor_id in points]
+
+    def owner(self, key):
+        """
+        returns the id of the actor owning key, the actor of the first point after the hash of key
+        """
+        index = bisect.bisect(self._points, _mix(hash(key)))                                        # Find the first point after the hash of key,
+        return self._owners[index % len(self._owners)]                                              # wrapping around past the last point.
+
+def _point(name):
+    """
+    returns the point on a hash ring of a str
+    """
+    return int(hashlib.md5(name).hexdigest()[:16], 16)
+
+def _mix(h):
+    """
+    returns a hash spread over the points of a hash ring, so that similar hashes, such as those of consecutive ints, are far apart
+    """
+    h &= 0xFFFFFFFFFFFFFFFF
+    h = ((h ^ (h >> 33)) * 0xFF51AFD7ED558CCD) & 0xFFFFFFFFFFFFFFFF
+    h = ((h ^ (h >> 33)) * 0xC4CEB9FE1A85EC53) & 0xFFFFFFFFFFFFFFFF
+    return h ^ (h >> 33)
+
+def _update_ring(routing, actor_ids):
+    """
+    routes messages to the actors with the ids given, waking the router if they changed
+    """
+    if routing['ring'].actor_ids == frozenset(actor_ids): return
+    routing['ring'] = _HashRing(actor_ids)                  # The router picks up the new ring at once, as it is replaced rather than changed.
+    routing['changed'].set()
+
+def _route(inbox, routing, running_flag, error_queue, activity, key):
+    """
+    routes messages from the inbox of a keyed cast to the mailbox of the actor owning the key of each, until Cut is taken from the inbox and passed on to every actor,
+    returning messages left in the mailboxes of actors no longer listening to the inbox to be routed again
+    """
+    cut = False                                                                 # Whether Cut was taken from the inbox.
+    ring = None                                                                 # The ring messages were last routed by.
+    rerouted_at = _monotonic()                                                  # When messages were last routed again.
+    while running_flag.value == 1:                                              # While inbox reception is ongoing:
+        if (routing['ring'] is not ring or _monotonic() - rerouted_at >= _wake_secs     # If the listening actors changed, every _wake_secs seconds,
+            or (cut and routing['ring'].actor_ids - routing['cut'])):           # or before passing Cut on,
+            ring = routing['ring']
+            rerouted_at = _monotonic()
+            if ring.actor_ids:                                                  # route again the messages in the mailboxes of actors no longer listening, such as those parked,
+                for actor_id, mailbox in routing['mailboxes'].items():
+                    if actor_id in ring.actor_ids: continue
+                    routing['cut'].discard(actor_id)                            # passing Cut on again if they listen again, as any Cut in their mailboxes is dropped,
+                    for message in _taken(mailbox): _dispatch(message, ring, routing, running_flag, error_queue, activity, key, inbox)
+                for actor_id, message in _taken(routing['returned']):          # and the messages actors returned unreceived.
+                    if message is Cut: routing['cut'].discard(actor_id)
+                    else: _dispatch(message, ring, routing, running_flag, error_queue, activity, key, inbox)
+        if cut or not ring.actor_ids:                                           # Once Cut was taken, or while no actor listens,
+            if cut:                                                             # pass Cut on to every listening actor not yet passed it,
+                for actor_id in ring.actor_ids - routing['cut']:
+                    routing['mailboxes'][actor_id].put(Cut)
+                    routing['cut'].add(actor_id)
+            routing['changed'].wait(_wake_secs)                                 # and wait for the listening actors to change.
+            routing['changed'].clear()
+            continue
+        try: message = inbox.get(True, _wake_secs)                              # Take the next message from the inbox,
+        except Queue.Empty: continue
+        if message is Cut: cut = True                                           # noting Cut,
+        else: _dispatch(message, ring, routing, running_flag, error_queue, activity, key, inbox)   # and routing any other message,
+        _acknowledge(inbox, ())                                                 # acknowledged once in a mailbox.
+
+def _dispatch(message, ring, routing, running_flag, error_queue, activity, key, inbox):
+    """
+    puts message in the mailbox of the actor owning its key, with the messages of a chunk split into chunks by actor
+    """
+    if type(message) is _Chunk:                                                 # The messages of a chunk are put in chunks for each actor, in order.
+        parts = collections.OrderedDict()
+        for m in message.messages:
+            actor_id = _owner(ring, key, m, error_queue, activity)
+            if actor_id is not None: parts.setdefault(actor_id, []).append(m)
+        deliveries = [(actor_id, _Chunk(part, message.deadline)) for actor_id, part in parts.iteritems()]
+    else:                                                                       # A message held with a deadline is routed by the message held.
+        actor_id = _owner(ring, key, message.message if type(message) is _Expiring else message, error_queue, activity)
+        deliveries = [] if actor_id is None else [(actor_id, message)]
+    for actor_id, delivery in deliveries:
+        mailbox = routing['mailboxes'][actor_id]
+        while True:                                                             # Wait while the mailbox is full, for as long as inbox reception is ongoing
+            try:                                                                # and the actor listens,
+                mailbox.put(delivery, True, _wake_secs)
+                break
+            except Queue.Full:
+                if running_flag.value != 1:                                     # otherwise return the message to the inbox,
+                    inbox.put(delivery)
+                    break
+                if actor_id not in routing['ring'].actor_ids and routing['ring'].actor_ids:     # or route it again if the actor no longer listens, such as once parked or given up on.
+                    _dispatch(delivery, routing['ring'], routing, running_flag, error_queue, activity, key, inbox)
+                    break
+
+def _owner(ring, key, message, error_queue, activity):
+    """
+    returns the id of the actor owning the key of message, or None if key raised an exception, passed to the directing process to be handled with no actor_id
+    """
+    try: return ring.owner(key(message))
+    except Exception as exc:
+        error_queue.put((exc, message, None))
+        activity.set()
+        return None
+
+def _taken(mailbox):
+    """
+    returns the messages taken from a mailbox until it is empty, leaving out Cut
+    """
+    messages = []
+    while True:
+        try: message = mailbox.get_nowait()
+        except Queue.Empty: return messages
+        if message is not Cut: messages.append(message)
+
+def _drain(mailbox, inbox):
+    """
+    returns the messages left in the mailbox of an actor of a keyed cast to the inbox, leaving out Cut
+    """
+    _put_back(inbox, _taken(mailbox), False)
+
+class _KeyedInbox(object):
+    """
+    inbox of an actor of a keyed SupportingCast, taking messages from its mailbox, and returning messages it does not receive, and Cut, to the router
+    through a queue without a maximum size, so that the actor never waits on its own mailbox, which the router may have filled
+    """
+    def __init__(self, actor_id, mailbox, returned):
+        self.actor_id = actor_id                                                # The id of the actor,
+        self.mailbox = mailbox                                                  # its mailbox,
+        self.returned = returned                                                # and the queue of messages returned to the router, tagged with the actor id.
+
+    def get(self, block = True, timeout = None):
+        return self.mailbox.get(block, timeout)
+
+    def put(self, message, block = True, timeout = None):
+        self.returned.put((self.actor_id, message))
+
+    def get_nowait(self):
+        return self.get(False)
+
+    def put_nowait(self, message):
+        self.put(message, False)
+
+    def qsize(self):
+        return self.mailbox.qsize()
+
+    def empty(self):
+        return self.qsize() == 0
+
+class _StealingInbox(object):
+    """
+    inbox of an actor of a SupportingCast stealing work, taking messages from its local inbox, then from the local inboxes of the other actors in turn,
+    then from the inbox of the cast, where Cut is taken only once every local inbox is empty
+    """
+    def __init__(self, index, local_inboxes, inbox):
+        self.local = local_inboxes[index]                                       # The local inbox of the actor,
+        self.others = local_inboxes[index + 1:] + local_inboxes[:index]         # those of the other actors, starting with the next,
+        self.inbox = inbox                                                      # and the inbox of the cast.
+
+    def get(self, block = True, timeout = None):
+        deadline = None if timeout is None else _monotonic() + timeout
+        while True:
+            for local_inbox in [self.local] + self.others:                      # Take a message from the first local inbox holding any,
+                if not local_inbox.qsize(): continue                            # looking without locking,
+                try: return local_inbox.get_nowait()
+                except Queue.Empty: continue                                    # as another actor may have taken it first.
+            wait = 0. if not block else _steal_secs if deadline is None else min(_steal_secs, deadline - _monotonic())
+            try: message = self.inbox.get(True, wait) if wait > 0 else self.inbox.get_nowait()  # Otherwise wait on the inbox of the cast for a while,
+            except Queue.Empty:
+                if wait < _steal_secs and (not block or deadline is not None): raise    # until the timeout,
+                continue                                                        # trying to steal again in between.
+            if message is Cut and any(local_inbox.qsize() for local_inbox in [self.local] + self.others):
+                self.inbox.put(Cut)                                             # Messages put before Cut may have been put in local inboxes since they were found empty.
+                continue
+            return message
+
+    def put(self, message, block = True, timeout = None):
+        if message is Cut: self.inbox.put(Cut, block, timeout)                  # Cut is passed on through the inbox of the cast,
+        else: _put_local(self.local, self.inbox, message)                       # and messages returned unreceived to the local inbox.
+
+    def ack(self):
+        _acknowledge(self.inbox, ())                                            # Messages taken from the inbox of the cast are acknowledged there.
+
+    def get_nowait(self):
+        return self.get(False)
+
+    def put_nowait(self, message):
+        self.put(message, False)
+
+    def qsize(self):
+        return self.local.qsize() + sum(local_inbox.qsize() for local_inbox in self.others) + self.inbox.qsize()
+
+    def empty(self):
+        return self.qsize() == 0
+
+def _put_local(local_inbox, inbox, message):
+    """
+    puts message in a local inbox, or in the inbox of the cast if it is too large for the local inbox
+    """
+    try: local_inbox.put(message)
+    except ValueError: inbox.put(message)
+
 def _handle_direct(exc, message, actor_id, actors, instance_attributes):
     """
-    method called upon exception
+    method called upon exception, while the actor that raised it keeps listening
     """
     print "Actor with id <%s> raised an exception." %(actor_id)
     print "Message on which exception was raised: %s" %(message)
     print "Exception type: %s" %(type(exc))
     print "Exception message: %s" %(exc.message)
     print "Exception args: %s" %(", ".join([str(arg) for arg in exc.args]))
-    print "Terminating actor with id <%s>..." %(actor_id)
-    actors[actor_id].terminate()
-    print "Actor with id <%s> terminated." %(actor_id)
 
-def _listen_passive(inbox, receive, listening_flag, message_received_flag, handling_error_flag, cut_flag, error_queue, actor_attributes):
+def _listen_passive(inbox, receive, listening_flag, wake, counters, row, message_received_flag, cut_flag, error_queue, activity, actor_attributes):
     """
-    listens for incoming messages, passes exceptions and the message that caused them to handle
+    listens for incoming messages, passes exceptions and the message that caused them to the directing process, to be handled without pausing
+    listening_flag - 1 : listening is ongoing, 3 : parked until woken, 2 : listening ends after messages already received, 0 : listening ends at once
+    counters - the runtime counters of the cast
+    row - the row of counters held by the actor, or None to record in the shared row
     """
-    while listening_flag.value == 1:                                        # While the listening process is ongoing:
+    batch_func = actor_attributes['receive_batch']                          # The function receiving batches of messages, if any.
+    max_batch = actor_attributes['max_batch'] if batch_func else 1          # Messages are gathered in batches when receiving batches, otherwise one at a time.
+    max_attempts = actor_attributes['supervisor'].max_attempts              # The number of times receive is attempted on a message before reporting an exception.
+    pending = collections.deque()                                           # Messages from chunks taken from the inbox that are yet to be received.
+    idle_since = time.time()                                                # When the actor last started waiting for messages.
+    expired = functools.partial(_count_expired, counters, row)            # Count messages dropped as expired.
+    while listening_flag.value in (1, 3) or (pending and listening_flag.value == 2): # While the listening process is ongoing, or is ending with messages already taken:
         
-        try:                                                                # Try to get a message immediately.
-            assert handling_error_flag.value == 0                           # First check that the process isn't currently handling an error,
-            assert error_queue.empty()                                      # then check that the error queue is empty,
-            message = inbox.get_nowait()                                    # now attempt to get a message at once.
-            if message is Cut:                                              # If the message is Cut,
-                cut_flag.value = 1                                          # toggle the flag to 1,
-                break                                                       # and break the listening process.
-            message_received_flag.value = 1                                 # If we get a non-Cut message without waiting, toggle flag indicating that a message was received.
+        if listening_flag.value == 3:                                       # If the actor is parked,
+            _put_back(inbox, pending, False)                                # return any messages already taken to the inbox,
+            pending.clear()
+            wake.wait(_wake_secs)                                           # sleep until woken
+            idle_since = time.time()                                        # Time parked is not idle time.
+            continue                                                        # and check again whether the listening process should continue.
         
-        except:                                                             # If any of the above fails
+        try:                                                                # Try to get a message,
+            message = _next(inbox, pending, _wake_secs, expired)            # blocking for at most _wake_secs seconds.
+        except Queue.Empty:                                                 # If no message arrived in that time
             continue                                                        # start the while loop again to ensure that the listening process should continue.
+        messages, cut = _get_batch(inbox, pending, message, max_batch,      # Gather the messages to receive and whether Cut was among them.
+                                   actor_attributes['max_latency'], expired)
+        if listening_flag.value in (0, 3):                                  # If the actor was told to stop listening at once or park while waiting,
+            _put_back(inbox, messages + list(pending), cut)                 # return the messages, and those pending, to the inbox unprocessed
+            pending.clear()
+            continue                                                        # and check again whether the listening process should continue.
         
-        try: 
-            new_attrs = receive(message, actor_attributes)                  # With a non-Cut message try executing the receive function on the message.
-            if type(new_attrs) is dict: actor_attributes.update(new_attrs)  # If receive returns any new attributes, update the instance attributes.
-        except Exception as exc:                                            # If an exception is raised:
-            error_queue.put((exc, message, actor_attributes['actor_id']))   # put it, the message, and the actor_id in the error queue,
-            handling_error_flag.value = 1                                   # and toggle the flag indicating that an error as being handled.
-            while handling_error_flag.value == 1:                           # While the flag is toggled to 1,
-                time.sleep(.1)                                              # wait to proceed with the listening process.
+        if messages:                                                        # If there are non-Cut messages,
+            message_received_flag.value = 1                                 # toggle flag indicating that a message was received.
+            message = messages if batch_func else messages[0]               # A batch is received as a list, otherwise the single message is received.
+            started = time.time()                                           # Note when receiving started.
+            errors = 0
+            for attempt in xrange(1, max_attempts + 1):                     # For each attempt allowed,
+                try: 
+                    new_attrs = (batch_func or receive)(message, actor_attributes)  # try executing the receive function on the message.
+                    if type(new_attrs) is dict: actor_attributes.update(new_attrs)  # If receive returns any new attributes, update the instance attributes.
+                    break                                                   # Stop attempting once receive succeeds.
+                except Exception as exc:                                    # If an exception is raised on the last attempt,
+                    if attempt < max_attempts: continue
+                    errors = 1
+                    error_queue.put((exc, message, actor_attributes['actor_id']))   # put it, the message, and the actor_id in the error queue,
+                    activity.set()                                          # wake the directing process to handle it, and keep listening.
+            counters.record(row, len(messages),                             # Count the messages received, the seconds spent receiving and waiting for them, and any exception.
+                            time.time() - started, started - idle_since, errors)
+            _acknowledge(inbox, pending)                                    # Acknowledge the messages received.
+            idle_since = time.time()
+        
+        if cut:                                                             # If the message is Cut,
+            cut_flag.value = 1                                              # toggle the flag to 1,
+            activity.set()                                                  # wake the directing process,
+            inbox.put(Cut)                                                  # pass Cut on, so that actors waiting on the inbox stop at once,
+            break                                                           # and break the listening process.
+    _put_back(inbox, pending, False)                                        # Return any messages from chunks that were not received to the inbox.
+    listening_flag.value = 0                                                # Flag that the actor ended on its own rather than dying,
+    activity.set()                                                          # and wake the directing process.
 
-def _direct(running_flag, num_actor_to_add, num_actor_added, instance_attributes):
+def _direct(running_flag, num_actor_to_add, num_actor_added, activity, instance_attributes, counters, placed = None, worker = multiprocessing.Process):
     """
-    cast and direct multiple actors receiving messages from a common inbox
+    cast and direct multiple actors receiving messages from a common inbox, each running in a worker, a multiprocessing.Process or threading.Thread
     """
     running_flag.value = 1                                  # Flag inbox reception as ongoing.
+    placement = instance_attributes['placement']            # The policy used to pin processes to CPUs, if any
+    if placement is not None: _pin(placement.director, placed, 'director')  # Pin the directing process first, so that actor processes start on its CPUs.
+    with num_actor_to_add.get_lock():                       # Actors added when inbox reception last ran are added again.
+        num_actor_to_add.value += num_actor_added.value
+        num_actor_added.value = 0
     del instance_attributes['num']                          # The num value for the instance of supporting cast may change so it is dropped as an attribute
+    counters.release_all()                                  # Counters of actors of an earlier run are kept as those of retired actors.
     message_received_flag = multiprocessing.Value('i', 0)   # 1 : some actor recently received a message, 0 : actor has not received a message since last checked
-    handling_error_flag = multiprocessing.Value('i', 0)     # 1 : _direct process is currently handling an error, 0 :  _direct process is not currently handling an error
     cut_flag = multiprocessing.Value('i', 0)                # 1 : an actor received cut, 0 : no actor has yet received cut
-    error_queue = multiprocessing.Manager().Queue()         # This queue holds information about errors
-    actors = {}                                             # This dictionary holds the listening flags and processes for each actor
-
-    # Use a timeout if timeout is an integer, otherwise do not.
-    # If a timeout is being used, set an alarm to run _timeout after timeout seconds.
-    use_timeout = True if type(instance_attributes['timeout']) == int else False                                                                               
-    if use_timeout:
-        signal.signal(signal.SIGALRM, functools.partial(_timeout, running_flag = running_flag))
-        signal.alarm(instance_attributes['timeout'])
+    manager = None if worker is threading.Thread else _manager()            # The manager serving queues shared with actor processes
+    error_queue = Queue.Queue() if manager is None else manager.Queue()     # This queue holds information about errors
+    actors = {}                                             # This dictionary holds the listening flags, wake events and processes for each actor
+    retired = []                                            # This list holds the processes and rows of counters of actors stopped before inbox reception ends
+    warm = instance_attributes['warm']                      # The number of parked actors to keep started
+    actor_ids = itertools.count()                           # Each actor started has the next id
+    autoscale = instance_attributes['autoscale']            # The policy used to add and remove actors, if any
+    supervisor = instance_attributes['supervisor']          # The policy used to restart actors and dispose of messages on which exceptions were raised
+    local_inboxes = instance_attributes['local_inboxes']    # If stealing work, the local inbox of each actor
+    routing = None                                          # If messages are routed by key, the hash ring of listening actors and the mailbox of each actor
+    if instance_attributes['key'] is not None:
+        routing = {'ring' : _HashRing([]), 'mailboxes' : {}, 'changed' : threading.Event(), 'cut' : set(),
+                   'returned' : Queue.Queue() if manager is None else manager.Queue()}
+        router = threading.Thread(target = _route, args = [instance_attributes['inbox'], routing, running_flag, error_queue, activity, instance_attributes['key']])
+        router.daemon = True
+        router.start()                                      # A thread of the directing process routes messages from the inbox to the mailboxes.
+
+    def cast(listening_flag):
+        """
+        starts a new actor with the listening flag given, 1 to listen at once or 3 to park
+        """
+        actor_id = next(actor_ids)                                                                  # The new actor has the next id.
+        actor = actors[actor_id] = {'listening_flag' : multiprocessing.Value('i', listening_flag),  # Create a dictionary for a new actor with its listening flag,
+                                    'wake' : multiprocessing.Event(),                               # an event set to wake it when its listening flag changes,
+                                    'restarts' : 0, 'restart_at' : None,                            # how many times and when next it is restarted,
+                                    'row' : counters.claim(actor_id)}                               # and the row of counters it holds while it runs.
+        if routing is not None:                                                                     # If messages are routed by key, the actor has a mailbox of its own.
+            routing['mailboxes'][actor_id] = Queue.Queue(_mailbox_maxsize) if manager is None else manager.Queue(_mailbox_maxsize)
+        start(actor_id)
+
+    def start(actor_id):
+        """
+        starts the process of the actor with the id given
+        """
+        actor = actors[actor_id]
+        inbox = instance_attributes['inbox']                                                        # The actor takes messages from the inbox,
+        if routing is not None: inbox = _KeyedInbox(actor_id, routing['mailboxes'][actor_id], routing['returned'])    # or from its mailbox if messages are routed by key,
+        elif local_inboxes: inbox = _StealingInbox(actor_id % len(local_inboxes), local_inboxes, inbox) # or from the local inboxes first if stealing work.
+        actor['process'] = worker(                                                                  # The new actor has a process which runs _listen_passive, profiled if profiling, and is passed the necessary arguments.
+            target = _pinned(_profiled(_listen_passive, instance_attributes['profile'], actor_id), placement, placed, actor_id), 
+            args = [inbox, instance_attributes['receive'], 
+                    actor['listening_flag'], actor['wake'], counters, actor['row'], message_received_flag, 
+                    cut_flag, error_queue, activity,
+                    dict(instance_attributes.items() + {'actor_id': actor_id}.items())])
+        actor['process'].start()                                                                    # The new actor process is started.
+
+    timeout = instance_attributes['timeout']                                                        # If there is a timeout,
+    idle_deadline = _deadline(timeout)                                                              # inbox reception ends once no actor receives a message before this deadline.
     
+    activity.set()                                                                                  # Start without waiting for activity.
     while running_flag.value == 1:                                                                  # While inbox reception is ongoing:
         
+        activity.wait(_wait_secs(idle_deadline))                                                    # Block until an actor, add, remove or cut signals activity, for at most _wake_secs seconds or until the timeout,
+        activity.clear()                                                                            # then clear the signal so that later activity is not missed.
+        
         try:                                                                                        # Try the following:
 
             if num_actor_to_add.value != 0:                                                         # If the number of actors to add is not equal to zero,
-                if use_timeout: signal.alarm(0)                                                     # Turn off the alarm if appropriate.
-                n = len(actors)                                                                     # n is the number of actors we currently have.
-                if num_actor_to_add.value > 0:                                                      # If the number of actors to add is positive.
-                    actors[n] = {'listening_flag' : multiprocessing.Value('i', 1)}                  # Create a dictionary for a new actor with a listening flag toggled to 1 indicating the listening process is ongoing.
-                    actors[n]['process'] = multiprocessing.Process(                                 # The new actor has a process which runs _listen_passive and is passed the necessary arguments.
-                        target = _listen_passive, 
-                        args = [instance_attributes['inbox'], instance_attributes['receive'], 
-                                actors[n]['listening_flag'], message_received_flag, 
-                                handling_error_flag, cut_flag, error_queue, 
-                                dict(instance_attributes.items() + {'actor_id': n}.items())])
-                    actors[n]['process'].start()                                                    # The new actor process is started.
-                    num_actor_to_add.value -= 1                                                     # The number of actors to add decreases by 1.
-                    num_actor_added.value += 1                                                      # The number of actors added increases by 1.
-                elif num_actor_to_add.value < 0:                                                    # If the number of actors to add is negative
-                    if n <= 0: num_actor_to_add.value += 1                                          # but there are zero actors, increase the number of actors to add by 1 (toward zero), but make no other changes.
-                    else:                                                                           # Otherwise, remove an actor
-                        actors[n-1]['listening_flag'].value = 0                                     # by toggling off its listening flag,
-                        while actors[n-1]['process'].is_alive(): time.sleep(.1)                     # waiting for its process to stop
-                        del actors[n-1]                                                             # then removing the actor from the actors dictionary.
-                        num_actor_to_add.value += 1                                                 # The number of actors to add increases by 1 (toward zero).
-                        num_actor_added.value -= 1                                                  # The number of actors added decreases by 1.
-                signal.alarm(instance_attributes['timeout'])                                        # Reset the alarm if appropriate
-                continue                                                                            # and jump to the top of the loop.
-
-            if not any([actor['process'].is_alive() for actor in actors.values()]):                 # If no actor is alive,
+                with num_actor_to_add.get_lock():                                                   # Take all of the actors to add at once,
+                    num = num_actor_to_add.value                                                    
+                    num_actor_to_add.value = 0                                                      # leaving none to add.
+                active = sorted(_with_flag(actors, 1))                                              # Find the ids of actors listening
+                parked = sorted(_with_flag(actors, 3))                                              # and those parked.
+                num = max(num, -len(active))                                                        # No more actors than are listening can be removed.
+                for actor_id in parked[:max(num, 0)]:                                               # If adding, first activate parked actors,
+                    _set_flag(actors[actor_id], 1)
+                for _ in xrange(num - len(parked)):                                                 # then start new actors for the rest.
+                    cast(1)
+                for actor_id in active[len(active) + min(num, 0):]:                                 # If removing, park the most recently added listening actors.
+                    _set_flag(actors[actor_id], 3)
+                num_actor_added.value += num                                                        # The number of actors added changes by the number added.
+                idle_deadline = _deadline(timeout)                                                  # Reset the timeout.
+            
+            if autoscale is not None:                                                               # If there is an autoscaling policy,
+                num = autoscale(num_actor_added.value + num_actor_to_add.value,                     # evaluate it given the number of actors, the inbox depth including any mailboxes,
+                                instance_attributes['inbox'].qsize() + sum(queue.qsize() for queue in
+                                    (routing['mailboxes'].values() if routing is not None else local_inboxes or [])),
+                                counters.total('received'),                                         # and the messages received and seconds spent receiving them,
+                                counters.total('busy_secs'))
+                if num: _add(num_actor_to_add, activity, num)                                       # then add or remove actors accordingly.
+            
+            parked = sorted(_with_flag(actors, 3))                                                  # Find the ids of parked actors.
+            if len(parked) > warm:                                                                  # If more actors are parked than are kept warm,
+                for actor_id in parked[warm:]:                                                      # stop the most recently added of them,
+                    _set_flag(actors[actor_id], 0)
+                    actor = actors.pop(actor_id)
+                    retired.append((actor['process'], actor['row']))                                # without waiting for them to exit.
+                    if placed is not None: placed.pop(actor_id, None)
+            elif len(parked) < warm:                                                                # If fewer actors are parked than are kept warm,
+                cast(3)                                                                             # start one more parked actor,
+                activity.set()                                                                      # and check again at once whether more are needed.
+
+            now = time.time()
+            for actor_id in _with_flag(actors, 1):                                                  # For each listening actor,
+                actor = actors[actor_id]
+                if actor['process'].is_alive(): continue                                            # if its process died,
+                if actor['restart_at'] is None and hasattr(instance_attributes['inbox'], 'reclaim'):    # return the messages it took but did not acknowledge to the inbox,
+                    instance_attributes['inbox'].reclaim()
+                if actor['restarts'] >= supervisor.max_restarts:                                    # and if it was restarted as many times as allowed,
+                    counters.release(actors.pop(actor_id)['row'])                                   # give up on it,
+                    if placed is not None: placed.pop(actor_id, None)
+                    num_actor_added.value -= 1                                                      # so that there is one fewer actor.
+                elif actor['restart_at'] is None:                                                   # Otherwise, if its restart is not yet scheduled,
+                    actor['restart_at'] = now + supervisor.backoff_secs(actor['restarts'])          # schedule it after backing off,
+                elif actor['restart_at'] <= now:                                                    # and once that time has come,
+                    actor['restarts'] += 1                                                          # count the restart
+                    actor['restart_at'] = None
+                    start(actor_id)                                                                 # and start a new process for the actor.
+
+            for actor_id in _with_flag(actors, 3):                                                  # Parked actors whose processes died
+                if not actors[actor_id]['process'].is_alive(): counters.release(actors.pop(actor_id)['row'])    # are replaced by starting new parked actors.
+
+            for process, row in [(process, row) for process, row in retired if not process.is_alive()]:     # Rows of counters of retired actors that exited are freed.
+                counters.release(row)
+                retired.remove((process, row))
+
+            if routing is not None: _update_ring(routing, _with_flag(actors, 1))                   # Messages are routed to the listening actors.
+
+            if not _with_flag(actors, 1):                                                           # If no actor is listening,
                 running_flag.value = 0                                                              # flag inbox reception as complete,
                 break                                                                               # and break inbox reception.
             
             while not error_queue.empty():                                                          # If there is an exception in the error queue,
-                if use_timeout: signal.alarm(0)                                                     # turn the alarm off if appropriate,
                 (exc, message, actor_id) = error_queue.get()                                        # catch the exception, the message, and the actor_id,
-                instance_attributes['handle'](exc, message, actor_id, actors, instance_attributes)  # and pass them to handle.
-                if use_timeout: signal.alarm(instance_attributes['timeout'])                        # Reset the alarm if appropriate.
-            handling_error_flag.value = 0                                                           # When the error queue is empty, turn off the flag.    
+                instance_attributes['handle'](exc, message, actor_id, actors, instance_attributes)  # pass them to handle,
+                if supervisor.dead_letters is not None:                                             # and if there is a dead letter queue,
+                    supervisor.dead_letters.put((message, exc))                                     # put the message and exception in it.
+                idle_deadline = _deadline(timeout)                                                  # Reset the timeout.
             
-            if cut_flag.value == 1:                                                                 # If one of the actors received Cut,
-                if use_timeout: signal.alarm(0)                                                     # turn off the alarm,
-                while not instance_attributes['inbox'].empty(): time.sleep(.1)                      # wait for the inbox to be empty,
-                running_flag.value = 0                                                              # flag inbox reception as complete,      
+            if cut_flag.value == 1 and routing is None:                                             # If one of the actors received Cut, every message before it was taken,
+                running_flag.value = 0                                                              # so flag inbox reception as complete,
                 break                                                                               # and break inbox reception.
 
-            if use_timeout:                                                                         # If a timeout is being used,
-                if message_received_flag.value == 1:                                                # and a message was received
-                    signal.alarm(instance_attributes['timeout'])                                    # reset the alarm,
-                    message_received_flag.value = 0                                                 # and toggle the flag back to zero.
+            if message_received_flag.value == 1:                                                    # If a message was received,
+                idle_deadline = _deadline(timeout)                                                  # reset the timeout,
+                message_received_flag.value = 0                                                     # and toggle the flag back to zero.
+            elif idle_deadline is not None and _monotonic() >= idle_deadline:                       # otherwise if the timeout passed,
+                running_flag.value = 0                                                              # flag inbox reception as complete,
+                break                                                                               # and break inbox reception.
 
         except:                                                                                     # If any of the above failed,
             continue                                                                                # jump to the top of the while loop to check if inbox reception is ongoing.
     
-    for actor in actors.values(): actor['listening_flag'].value = 0                                 # Once the main loop is escaped, the actors are toggled to stop listening,
-    while any([actor['process'].is_alive() for actor in actors.values()]): time.sleep(.1)           # sleep while the actors are ongoing.
+    for actor in actors.values():                                                                   # Once the main loop is escaped, the actors are toggled to stop listening,
+        _set_flag(actor, 0 if running_flag.value == -1 else 2)                                      # at once if cut immediately, otherwise after receiving any messages they already took.
+    for process in [actor['process'] for actor in actors.values()] + [process for process, _ in retired]: process.join()   # Wait for the actors to stop.
+    for _, row in retired: counters.release(row)
+    _merge_profiles(instance_attributes['profile'])                                                 # Merge the profiles the actors wrote, if profiling.
+    if routing is not None:                                                                         # If messages were routed by key,
+        routing['changed'].set()                                                                    # wake the router
+        router.join()                                                                               # and wait for it to stop,
+        for mailbox in routing['mailboxes'].values(): _drain(mailbox, instance_attributes['inbox']) # and return messages left in the mailboxes,
+        _put_back(instance_attributes['inbox'], [message for _, message in _taken(routing['returned']) if message is not Cut], False)  # or returned by actors, to the inbox.
+    if cut_flag.value == 1: _drop_cuts(instance_attributes['inbox'])                                # Remove Cut passed on by the actors from the inbox.
     if running_flag.value != -1: instance_attributes['callback'](instance_attributes)               # If running_flag does not have a value of -1 indicating the process was not cut immediately, execute callback.
 
-def _add(num_actor_to_add, num):
+def _profiled(target, path, actor_id, merge = False):
     """
-    adds num to num_actor_to_add
+    returns target run under cProfile, writing its profile to the directory path once it returns or raises, then merging the profiles there if merge is True,
+    or target itself if path is None
     """
-    num_actor_to_add.value += num 
+    if path is None: return target
+    def profiled(*args):
+        profiler = cProfile.Profile()
+        try: return profiler.runcall(target, *args)
+        finally:
+            profiler.dump_stats(os.path.join(path, 'actor-%s-%s-%s.prof' %(actor_id, os.getpid(), next(_profile_ids))))
+            if merge: _merge_profiles(path)
+    return profiled
+
+def _load_profiles(path):
+    """
+    returns pstats.Stats merging the profiles written by actors to the directory path, or None if there are none
+    """
+    files = sorted(glob.glob(os.path.join(path, 'actor-*.prof')))
+    return pstats.Stats(*files) if files else None
+
+def _merge_profiles(path):
+    """
+    merges the profiles written by actors to the directory path into one file there, if path is not None
+    """
+    stats = _load_profiles(path) if path is not None else None
+    if stats is not None: stats.dump_stats(os.path.join(path, _merged_profile))
+
+def _clear_profiles(path):
+    """
+    creates the directory path if it does not exist, otherwise removes the profiles written to it
+    """
+    if not os.path.isdir(path): os.makedirs(path)
+    for name in glob.glob(os.path.join(path, 'actor-*.prof')) + [os.path.join(path, _merged_profile)]:
+        if os.path.exists(name): os.remove(name)
+
+def _pinned(target, placement, placed, actor_id):
+    """
+    returns target pinning the process or thread running it to the CPUs placement gives the actor with the id given, or target itself if placement is None
+    """
+    if placement is None: return target
+    def pinned(*args):
+        _pin(placement.actor_cpus(actor_id), placed, actor_id)
+        return target(*args)
+    return pinned
+
+def _pin(cpus, placed, name):
+    """
+    pins the calling process or thread to cpus, recording the CPUs it may then run on in placed by name
+    """
+    _set_affinity(cpus)
+    placed[name] = _get_affinity()
+
+def _affinity_functions():
+    """
+    returns the sched_getaffinity and sched_setaffinity functions of the C library, or None where not available
+    """
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno = True)
+        return libc.sched_getaffinity, libc.sched_setaffinity
+    except (OSError, AttributeError):
+        return None
+
+_affinity = _affinity_functions() # CPU affinity is read and set through these functions, which act on the calling thread.
+
+def _get_affinity():
+    """
+    returns the CPUs the calling process or thread may run on
+    """
+    if _affinity is None: raise OSError("CPU affinity is not supported on this platform.")
+    mask = (ctypes.c_ubyte * (_cpu_set_bits // 8))()
+    if _affinity[0](0, ctypes.sizeof(mask), mask) != 0: raise OSError(ctypes.get_errno(), "sched_getaffinity failed.")
+    return [cpu for cpu in xrange(_cpu_set_bits) if mask[cpu // 8] & (1 << cpu % 8)]
+
+def _set_affinity(cpus):
+    """
+    pins the calling process or thread to cpus
+    """
+    if _affinity is None: raise OSError("CPU affinity is not supported on this platform.")
+    mask = (ctypes.c_ubyte * (_cpu_set_bits // 8))()
+    for cpu in cpus: mask[cpu // 8] |= 1 << cpu % 8
+    if _affinity[1](0, ctypes.sizeof(mask), mask) != 0: raise OSError(ctypes.get_errno(), "sched_setaffinity failed.")
+
+def _order_cpus(cpus, spread):
+    """
+    returns cpus in the order they are used, one from each physical core of a socket before a second from any,
+    and one from each socket in turn if spread, otherwise every CPU of a socket before the next
+    """
+    sockets = collections.defaultdict(list)                                                     # The CPUs of each socket,
+    siblings = collections.Counter()                                                            # where CPUs sharing a physical core with CPUs before them come last.
+    for cpu in cpus:
+        core = (_read_topology(cpu, 'physical_package_id'), _read_topology(cpu, 'core_id'))
+        sockets[core[0]].append((siblings[core], cpu))
+        siblings[core] += 1
+    ordered = [[cpu for _, cpu in sorted(socket)] for _, socket in sorted(sockets.items())]
+    if not spread: return [cpu for socket in ordered for cpu in socket]
+    return [cpu for turn in itertools.izip_longest(*ordered) for cpu in turn if cpu is not None]
+
+def _read_topology(cpu, name):
+    """
+    returns the id of the socket or physical core of cpu, named physical_package_id and core_id respectively, or cpu itself if unknown
+    """
+    try:
+        with open(_topology %(cpu, name)) as topology: return int(topology.read())
+    except (IOError, ValueError):
+        return cpu if name == 'core_id' else 0
+
+def _join_started():
+    """
+    waits for inbox reception processes still running at interpreter exit,
+    before multiprocessing shuts down the managers serving their inboxes
+    """
+    for process in list(_started):
+        if process.is_alive(): process.join()
+
+atexit.register(_join_started) # Registered after multiprocessing registers its own exit function, so run before it.
+
+def _report(actor, process):
+    """
+    calls the report function of actor with its runtime metrics every report_interval seconds while process is alive
+    """
+    while process.is_alive():
+        process.join(actor.report_interval)
+        actor.report(actor.stats())
+
+def _with_flag(actors, listening_flag):
+    """
+    returns the ids of actors with the listening flag given
+    """
+    return [actor_id for actor_id, actor in actors.iteritems() if actor['listening_flag'].value == listening_flag]
+
+def _set_flag(actor, listening_flag):
+    """
+    sets the listening flag of actor, waking it unless it is parked
+    """
+    if listening_flag == 3: actor['wake'].clear()   # A parked actor sleeps until woken,
+    actor['listening_flag'].value = listening_flag  # otherwise it is woken to respond to its new listening flag at once.
+    if listening_flag != 3: actor['wake'].set()
+
+def _add(num_actor_to_add, activity, num):
+    """
+    adds num to num_actor_to_add and wakes the directing process
+    """
+    with num_actor_to_add.get_lock(): num_actor_to_add.value += num    # Added under the lock the directing process takes actors to add under, so that none are taken twice.
+    activity.set()
 
 def _collect(new_message, prior_collected, instance_attributes):
     """
     returns collected messages when passed a new message and prior messages, requires implementation
     """
     raise NotImplemented()
+
+def _combine(collected, other_collected):
+    """
+    returns the combination of messages collected by two processes, requires implementation
+    """
+    raise NotImplemented()
@@ -0,0 +1,213 @@
+import cStringIO
+import cPickle
+import marshal
+import struct
+
+_count = struct.Struct('<I')    # A message encoded as one str starts with the number of buffers handed over out of band,
+_length = struct.Struct('<Q')   # followed by the length of the pickle and of each buffer.
+
+class Codec(object):
+    """
+    Base class of codecs turning messages into bytes and back, used by caine.CodecQueue, caine.RingInbox and caine.Collector.
+    Subclasses implement encode and decode.
+    """
+    def encode(self, message):
+        """
+        returns a str holding message, or a tuple of a str and a list of buffers holding parts of message handed over out of band
+        """
+        raise NotImplementedError()
+
+    def decode(self, data, buffers = ()):
+        """
+        returns the message held by the str data and the list of buffers handed over out of band with it, as strs or bytearrays
+        """
+        raise NotImplementedError()
+
+    def dumps(self, message):
+        """
+        returns a str holding message, with any buffers handed over out of band appended
+        """
+        encoded = self.encode(message)
+        data, buffers = encoded if type(encoded) is tuple else (encoded, [])
+        parts = [data] + [buf if type(buf) is str else buffer(buf) for buf in buffers]
+        output = cStringIO.StringIO()
+        output.write(_count.pack(len(buffers)))
+        for part in parts: output.write(_length.pack(len(part)))
+        for part in parts: output.write(part)
+        return output.getvalue()
+
+    def loads(self, data):
+        """
+        returns the message held by a str returned by dumps
+        """
+        count = _count.unpack_from(data)[0]
+        lengths = [_length.unpack_from(data, _count.size + i * _length.size)[0] for i in xrange(count + 1)]
+        parts, start = [], _count.size + (count + 1) * _length.size
+        for length in lengths:
+            parts.append(data[start:start + length])
+            start += length
+        return self.decode(parts[0], parts[1:])
+
+class PickleCodec(Codec):
+    """
+    Codec pickling messages, as inboxes do by default.
+
+    Parameters
+    __________
+    protocol : int, default cPickle.HIGHEST_PROTOCOL
+        The pickle protocol
+    """
+    def __init__(self, protocol = cPickle.HIGHEST_PROTOCOL):
+        self.protocol = protocol
+
+    def encode(self, message):
+        return cPickle.dumps(message, self.protocol)
+
+    def decode(self, data, buffers = ()):
+        return cPickle.loads(data)
+
+class MarshalCodec(Codec):
+    """
+    Codec using marshal, which is faster than pickle for messages made only of None, booleans, numbers, strings,
+    and tuples, lists, sets and dicts of them, and raises ValueError for other messages.
+    """
+    def encode(self, message):
+        return marshal.dumps(message, 2)
+
+    def decode(self, data, buffers = ()):
+        return marshal.loads(data)
+
+class BufferCodec(Codec):
+    """
+    Codec pickling messages, where strs, bytearrays and numpy arrays of at least threshold bytes anywhere in a message are handed over out of band
+    rather than copied into the pickle. caine.RingInbox copies such buffers directly to and from shared memory.
+    Arrays are handed over out of band only if they are C-contiguous and hold no objects, and are received as writable arrays backed by a bytearray.
+
+    Parameters
+    __________
+    threshold : int, default 65536
+        The minimum number of bytes of a buffer handed over out of band
+    protocol : int, default cPickle.HIGHEST_PROTOCOL
+        The pickle protocol, at least 1
+    """
+    def __init__(self, threshold = 2 ** 16, protocol = cPickle.HIGHEST_PROTOCOL):
+        self.threshold = threshold
+        self.protocol = protocol
+
+    def encode(self, message):
+        buffers = []
+        def persistent_id(obj):
+            kind = _buffer_kind(obj)
+            if kind is None or _nbytes(obj) < self.threshold: return None           # Small buffers and other objects are pickled.
+            buffers.append(obj)
+            if kind == 'ndarray':                                                   # Arrays are rebuilt from their type and shape.
+                dtype = obj.dtype.str if obj.dtype.fields is None else obj.dtype.descr
+                return (kind, len(buffers) - 1, dtype, obj.shape)
+            return (kind, len(buffers) - 1)
+        output = cStringIO.StringIO()
+        pickler = cPickle.Pickler(output, self.protocol)
+        pickler.persistent_id = persistent_id
+        pickler.dump(message)
+        return output.getvalue(), buffers
+
+    def decode(self, data, buffers = ()):
+        def persistent_load(pid):
+            kind, buf = pid[0], buffers[pid[1]]
+            if kind == 'str': return buf if type(buf) is str else str(buf)
+            if kind == 'bytearray': return buf if type(buf) is bytearray else bytearray(buf)
+            import numpy                                                            # Arrays are only handed over if numpy is installed.
+            if type(buf) is not bytearray: buf = bytearray(buf)                     # Back the array with writable memory.
+            return numpy.frombuffer(buf, numpy.dtype(pid[2])).reshape(pid[3])
+        unpickler = cPickle.Unpickler(cStringIO.StringIO(data))
+        unpickler.persistent_load = persistent_load
+        return unpickler.load()
+
+class CodecQueue(object):
+    """
+    Queue encoding messages with a codec before putting them in another queue, such as a multiprocessing.Manager().Queue, and decoding them once gotten.
+
+    Parameters
+    __________
+    queue : queue
+        The queue encoded messages are put in
+    codec : caine.Codec
+        The codec
+    """
+    def __init__(self, queue, codec):
+        self.queue = queue
+        self.codec = codec
+
+    def put(self, message, block = True, timeout = None):
+        """
+        puts message, encoded, in the queue
+        """
+        self.queue.put(_encode_message(self.codec, message), block, timeout)
+
+    def get(self, block = True, timeout = None):
+        """
+        removes and returns a message from the queue, decoded
+        """
+        return _decode_message(self.codec, self.queue.get(block, timeout))
+
+    def put_nowait(self, message):
+        """
+        puts message, encoded, in the queue if there is room, otherwise raises Queue.Full
+        """
+        self.put(message, False)
+
+    def get_nowait(self):
+        """
+        removes and returns a message from the queue, decoded, if there is one, otherwise raises Queue.Empty
+        """
+        return self.get(False)
+
+    def qsize(self):
+        """
+        the number of messages in the queue
+        """
+        return self.queue.qsize()
+
+    def empty(self):
+        """
+        True if the queue has no messages, otherwise False
+        """
+        return self.queue.empty()
+
+    def full(self):
+        """
+        True if the queue is full, otherwise False
+        """
+        return self.queue.full()
+
+def _buffer_kind(obj):
+    """
+    returns the kind of buffer obj is if it may be handed over out of band, otherwise None
+    """
+    if type(obj) is str: return 'str'
+    if type(obj) is bytearray: return 'bytearray'
+    if (type(obj).__name__ == 'ndarray' and type(obj).__module__ == 'numpy'
+            and obj.flags['C_CONTIGUOUS'] and not obj.dtype.hasobject): return 'ndarray'
+    return None
+
+def _nbytes(obj):
+    return obj.nbytes if hasattr(obj, 'nbytes') else len(obj)
+
+def _encode_message(codec, message):
+    """
+    returns message encoded as a str by codec, with the messages of a chunk encoded one by one, the message held with a deadline encoded, and Cut as is
+    """
+    from .caine import Cut, _Chunk, _Expiring                                       # Imported here, as caine imports this module.
+    if message is Cut: return message
+    if type(message) is _Chunk: return _Chunk([codec.dumps(m) for m in message.messages], message.deadline)
+    if type(message) is _Expiring: return _Expiring(codec.dumps(message.message), message.deadline)
+    return codec.dumps(message)
+
+def _decode_message(codec, message):
+    """
+    returns message as it was before _encode_message
+    """
+    from .caine import Cut, _Chunk, _Expiring
+    if message is Cut: return message
+    if type(message) is _Chunk: return _Chunk([codec.loads(m) for m in message.messages], message.deadline)
+    if type(message) is _Expiring: return _Expiring(codec.loads(message.message), message.deadline)
+    return codec.loads(message)
@@ -0,0 +1,848 @@
+import multiprocessing
+import threading
+import ctypes
+import struct
+import time
+import cPickle
+import Queue
+import mmap
+import os
+import collections
+from .codec import _encode_message, _decode_message, _count, _length
+
+_header = struct.Struct('<IB')  # Each message in a ring buffer is preceded by its size in bytes and the kind of message it is.
+_PICKLED, _STR, _BYTEARRAY, _ENCODED = range(4)    # The kinds of message: pickled objects, strs, bytearrays holding the contents of buffers, and messages encoded by a codec.
+_SKIP = 4                       # Marks the rest of a segment file of a DurableInbox as unused.
+_offset = struct.Struct('<Q')   # The offset before which every message of a DurableInbox is acknowledged, as kept on disk.
+_slots = 256                    # The number of threads that may hold messages of a DurableInbox in flight at once.
+_slot_messages = 128            # The number of messages in flight of each slot whose offsets are kept, beyond which every message since the first is received again if its process dies.
+_returnable = 4096              # The number of runs of messages taken from one mailbox of a PriorityInbox noted by each thread, so that messages returned unreceived go back to their mailboxes.
+
+class RingInbox(object):
+    """
+    Inbox backed by a ring buffer in shared memory, usable in place of the multiprocessing.Manager().Queue of a SupportingActor.
+    Messages are copied into and out of shared memory directly rather than through a Manager process.
+    str and bytearray messages, and objects exposing a writable buffer, are copied as is and received as str, bytearray and bytearray respectively.
+    All other messages are pickled, unless a codec is given, in which case all messages are encoded by the codec,
+    and buffers it hands over out of band are copied directly to and from shared memory.
+    A RingInbox is shared with processes started after it is created.
+
+    Parameters
+    __________
+    maxsize : int or None, default None
+        If not None, the maximum number of messages in the inbox
+    capacity : int, default 16777216
+        The number of bytes of shared memory holding messages
+    codec : caine.Codec or None, default None
+        If not None, the codec encoding messages, such as a caine.BufferCodec
+    """
+    def __init__(self, maxsize = None, capacity = 2 ** 24, codec = None):
+        self.maxsize = maxsize or 0                                                 # The maximum number of messages, where 0 means there is no maximum.
+        self.capacity = capacity                                                    # The number of bytes of shared memory holding messages.
+        self.codec = codec                                                          # The codec encoding messages, if any.
+        self._buffer = multiprocessing.RawArray(ctypes.c_char, capacity)            # The ring buffer in shared memory,
+        self._address = ctypes.addressof(self._buffer)                              # at the same address in every process forked after it is created.
+        self._head = multiprocessing.RawValue(ctypes.c_ulonglong, 0)                # The total number of bytes ever read, the position of the next message to read.
+        self._tail = multiprocessing.RawValue(ctypes.c_ulonglong, 0)                # The total number of bytes ever written, the position of the next message to write.
+        self._count = multiprocessing.RawValue('i', 0)                              # The number of messages in the inbox.
+        self._condition = multiprocessing.Condition()                               # Guards the positions and count, and is notified whenever they change.
+
+    def put(self, message, block = True, timeout = None):
+        """
+        puts message in the inbox
+
+        Parameters
+        __________
+        message : object
+            The message
+        block : boolean, default True
+            If True, wait for room in the inbox, otherwise raise Queue.Full at once if there is none
+        timeout : float or None, default None
+            If not None, the maximum number of seconds to wait for room before raising Queue.Full
+        """
+        kind, parts = _encode(message, self.codec)                                  # Get the kind of message and the objects holding its bytes.
+        size = sum(len(part) for part in parts)                                     # Get the number of bytes to write.
+        if _header.size + size > self.capacity:                                     # If the message can never fit in the ring buffer,
+            raise ValueError("Message of %s bytes exceeds inbox capacity of %s bytes." %(size, self.capacity))
+        deadline = None if timeout is None else time.time() + timeout               # Find when to stop waiting for room, if ever.
+        with self._condition:                                                       # With the inbox locked:
+            while not self._has_room(_header.size + size):                          # While there is no room for the message,
+                _wait(self._condition, block, deadline, Queue.Full)                 # wait for a message to be read.
+            tail = self._tail.value                                                 # Write at the tail
+            self._write(tail, _header.pack(size, kind))                             # the header of the message,
+            position = tail + _header.size
+            for part in parts:                                                      # then the message itself.
+                self._write(position, part)
+                position += len(part)
+            self._tail.value = tail + _header.size + size                           # Move the tail past the message,
+            self._count.value += 1                                                  # count it,
+            self._condition.notify_all()                                            # and wake anyone waiting for it.
+
+    def get(self, block = True, timeout = None):
+        """
+        removes and returns a message from the inbox
+
+        Parameters
+        __________
+        block : boolean, default True
+            If True, wait for a message to arrive, otherwise raise Queue.Empty at once if there is none
+        timeout : float or None, default None
+            If not None, the maximum number of seconds to wait for a message before raising Queue.Empty
+        """
+        deadline = None if timeout is None else time.time() + timeout               # Find when to stop waiting for a message, if ever.
+        with self._condition:                                                       # With the inbox locked:
+            while self._count.value == 0:                                           # While there is no message,
+                _wait(self._condition, block, deadline, Queue.Empty)                # wait for one to be written.
+            kind, payload = self._take()                                            # Take the message.
+        return _decode(kind, payload, self.codec)                                   # Decode or unpickle the message outside the lock.
+
+    def put_nowait(self, message):
+        """
+        puts message in the inbox if there is room, otherwise raises Queue.Full
+        """
+        self.put(message, False)
+
+    def get_nowait(self):
+        """
+        removes and returns a message from the inbox if there is one, otherwise raises Queue.Empty
+        """
+        return self.get(False)
+
+    def qsize(self):
+        """
+        the number of messages in the inbox
+        """
+        return self._count.value
+
+    def empty(self):
+        """
+        True if the inbox has no messages, otherwise False
+        """
+        return self._count.value == 0
+
+    def full(self):
+        """
+        True if the inbox has maxsize messages, otherwise False
+        """
+        return 0 < self.maxsize <= self._count.value
+
+    def _take(self):
+        """
+        removes the message at the head of the inbox, which is locked and not empty, returning its kind and its bytes
+        """
+        head = self._head.value                                                 # Read at the head
+        size, kind = _header.unpack(self._read(head, _header.size, str))        # the header of the message,
+        if kind == _ENCODED:                                                    # then the message itself, as parts if it was encoded by the codec,
+            payload = self._read_parts(head + _header.size)
+        else:                                                                   # otherwise into a bytearray if that is what it was written from.
+            payload = self._read(head + _header.size, size, bytearray if kind == _BYTEARRAY else str)
+        self._head.value = head + _header.size + size                           # Move the head past the message,
+        self._count.value -= 1                                                  # stop counting it,
+        self._condition.notify_all()                                            # and wake anyone waiting for room.
+        return kind, payload
+
+    def _has_room(self, size):
+        return ((self.capacity - (self._tail.value - self._head.value) >= size) and         # There is room if there are enough free bytes
+                not (0 < self.maxsize <= self._count.value))                                # and the inbox is not full.
+
+    def _write(self, position, payload):
+        size = len(payload)                                                                 # Find the number of bytes to copy
+        offset = position % self.capacity                                                   # and the offset in the ring buffer they are copied to.
+        first = min(size, self.capacity - offset)                                           # Copy as many bytes as fit before the end of the ring buffer,
+        ctypes.memmove(self._address + offset, payload, first)
+        if first < size:                                                                    # then wrap around and copy the rest to its start.
+            rest = payload[first:] if type(payload) is str else ctypes.addressof(payload) + first
+            ctypes.memmove(self._address, rest, size - first)
+
+    def _read_parts(self, position):
+        count = _count.unpack(self._read(position, _count.size, str))[0]                    # Read the number of buffers handed over out of band,
+        position += _count.size
+        lengths = [_length.unpack(self._read(position + i * _length.size, _length.size, str))[0] for i in xrange(count + 1)]
+        position += (count + 1) * _length.size                                              # the length of each part,
+        parts = [self._read(position, lengths[0], str)]                                     # the str encoded by the codec,
+        position += lengths[0]
+        for length in lengths[1:]:                                                          # and each buffer into a bytearray.
+            parts.append(self._read(position, length, bytearray))
+            position += length
+        return parts
+
+    def _read(self, position, size, kind):
+        offset = position % self.capacity                                                   # Find the offset in the ring buffer to copy from.
+        first = min(size, self.capacity - offset)                                           # Copy as many bytes as there are before the end of the ring buffer,
+        second = size - first                                                               # and wrap around for the rest.
+        if kind is str:
+            start = ctypes.string_at(self._address + offset, first)
+            return start + ctypes.string_at(self._address, second) if second else start
+        payload = bytearray(size)
+        target = ctypes.addressof((ctypes.c_char * size).from_buffer(payload))
+        ctypes.memmove(target, self._address + offset, first)
+        if second: ctypes.memmove(target + first, self._address, second)
+        return payload
+
+class PriorityInbox(object):
+    """
+    Inbox of several named mailboxes, each a caine.RingInbox, usable in place of the multiprocessing.Manager().Queue of a SupportingActor.
+    Messages are taken from the mailboxes by strict priority, in the order the mailboxes are named, or by weighted fair share if weights are given,
+    so that messages in one mailbox are not held up behind a burst of messages in another.
+    Messages an actor returns unreceived, such as the rest of a chunk when it is parked, go back to the mailboxes they were taken from.
+    Cut is received only once every mailbox is empty.
+    A PriorityInbox is shared with processes started after it is created.
+
+    Parameters
+    __________
+    mailboxes : list of str, default ['high', 'low']
+        The names of the mailboxes, from the highest priority to the lowest
+    weights : dict or None, default None
+        If not None, the share of messages taken from each mailbox by name, where mailboxes without a weight have weight 1,
+        otherwise a message is taken from a mailbox only when every mailbox before it is empty
+    route : function or None, default None
+        If not None, called with each message put in the inbox, returning the name of the mailbox it is put in,
+        otherwise messages are put in the last mailbox. Chunks put by put_many are routed by their first message,
+        and messages put in a mailbox by caine.PriorityInbox.mailbox are not routed.
+    maxsize : int or None, default None
+        If not None, the maximum number of messages in each mailbox
+    capacity : int, default 16777216
+        The number of bytes of shared memory holding the messages of each mailbox
+    codec : caine.Codec or None, default None
+        If not None, the codec encoding messages, such as a caine.BufferCodec
+    """
+    def __init__(self, mailboxes = ('high', 'low'), weights = None, route = None, maxsize = None, capacity = 2 ** 24, codec = None):
+        if not mailboxes: raise ValueError("A priority inbox needs at least one mailbox.")
+        self.mailboxes = list(mailboxes)                                            # The names of the mailboxes in order of priority.
+        self.weights = weights                                                      # The share of messages taken from each mailbox, if any.
+        self.route = route                                                          # The function naming the mailbox of each message, if any.
+        self.maxsize = maxsize or 0                                                 # The maximum number of messages in each mailbox, where 0 means there is no maximum.
+        self.codec = codec                                                          # The codec encoding messages, if any.
+        self._condition = multiprocessing.Condition()                               # Guards every mailbox, and is notified whenever any of them changes.
+        self._rings = []                                                            # The ring buffer of each mailbox,
+        for name in self.mailboxes:
+            ring = RingInbox(maxsize, capacity, codec)
+            ring._condition = self._condition                                       # sharing the lock of the inbox, so that get waits on every mailbox at once.
+            self._rings.append(ring)
+        self._index = dict((name, i) for i, name in enumerate(self.mailboxes))      # The position of each mailbox by name.
+        self._weights = [float((weights or {}).get(name, 1)) for name in self.mailboxes]
+        self._credit = multiprocessing.RawArray('d', len(self.mailboxes))           # How far each mailbox is owed messages under weighted fair share.
+        self._cuts = multiprocessing.RawValue('i', 0)                               # The number of Cuts in the inbox.
+        self._local = threading.local()                                             # The mailboxes of the messages taken by this thread since it last acknowledged them.
+
+    def put(self, message, block = True, timeout = None):
+        """
+        puts message in the mailbox named by route, or in the last mailbox
+
+        Parameters
+        __________
+        message : object
+            The message
+        block : boolean, default True
+            If True, wait for room in the mailbox, otherwise raise Queue.Full at once if there is none
+        timeout : float or None, default None
+            If not None, the maximum number of seconds to wait for room before raising Queue.Full
+        """
+        if _is_cut(message): return self._put_cut()
+        name = self.route(_routed(message)) if self.route is not None else self.mailboxes[-1]
+        self.put_in(name, message, block, timeout)
+
+    def put_in(self, name, message, block = True, timeout = None):
+        """
+        puts message in the mailbox with the name given, as caine.PriorityInbox.put
+        """
+        if _is_cut(message): return self._put_cut()
+        if name not in self._index: raise KeyError("Unknown mailbox %s." %(name))
+        self._rings[self._index[name]].put(message, block, timeout)
+
+    def get(self, block = True, timeout = None):
+        """
+        removes and returns the next message from the mailboxes, or Cut once every mailbox is empty
+
+        Parameters
+        __________
+        block : boolean, default True
+            If True, wait for a message to arrive, otherwise raise Queue.Empty at once if there is none
+        timeout : float or None, default None
+            If not None, the maximum number of seconds to wait for a message before raising Queue.Empty
+        """
+        from .caine import Cut
+        deadline = None if timeout is None else time.time() + timeout               # Find when to stop waiting for a message, if ever.
+        with self._condition:                                                       # With the inbox locked:
+            while True:
+                ready = [i for i, ring in enumerate(self._rings) if ring._count.value]  # Find the mailboxes holding messages.
+                if ready: break
+                if self._cuts.value:                                                # If there are none but there is Cut,
+                    self._cuts.value -= 1                                           # take it.
+                    return Cut
+                _wait(self._condition, block, deadline, Queue.Empty)                # Otherwise wait for a message to be written.
+            picked = self._pick(ready)                                              # Take a message from the mailbox picked.
+            kind, payload = self._rings[picked]._take()
+        message = _decode(kind, payload, self.codec)                                # Decode or unpickle the message outside the lock,
+        self._note(picked, message)                                                 # and note where it was taken from.
+        return message
+
+    def put_back(self, messages):
+        """
+        returns messages taken by this thread but not received, the last it took in the order it took them, to the mailboxes they were taken from,
+        putting any it did not take as caine.PriorityInbox.put does. Called by actors for the messages they return unreceived.
+        """
+        messages = list(messages)
+        taken = getattr(self._local, 'taken', None) or collections.deque()
+        sources = []                                                                # The mailbox of each of the last messages taken, latest first.
+        while taken and len(sources) < len(messages):
+            run = taken[-1]
+            returned = min(run[1], len(messages) - len(sources))
+            sources.extend([run[0]] * returned)
+            run[1] -= returned                                                      # Messages returned are no longer noted as taken.
+            if not run[1]: taken.pop()
+        sources.extend([None] * (len(messages) - len(sources)))                     # Messages taken before those noted are put as they would be put.
+        for message, source in zip(messages, reversed(sources)):
+            if source is None: self.put(message)
+            else: self._rings[source].put(message)
+
+    def ack(self):
+        """
+        forgets the mailboxes of the messages taken by this thread, once they are received
+        """
+        self._local.taken = None
+
+    def mailbox(self, name):
+        """
+        returns a queue putting messages in the mailbox with the name given, which may be passed where an inbox or outbox is expected
+        """
+        if name not in self._index: raise KeyError("Unknown mailbox %s." %(name))
+        return Mailbox(self, name)
+
+    def depths(self):
+        """
+        dict of the number of messages in each mailbox by name
+        """
+        return dict((name, ring._count.value) for name, ring in zip(self.mailboxes, self._rings))
+
+    def put_nowait(self, message):
+        """
+        puts message in the inbox if there is room in its mailbox, otherwise raises Queue.Full
+        """
+        self.put(message, False)
+
+    def get_nowait(self):
+        """
+        removes and returns a message from the inbox if there is one, otherwise raises Queue.Empty
+        """
+        return self.get(False)
+
+    def qsize(self):
+        """
+        the number of messages in the inbox
+        """
+        return sum(ring._count.value for ring in self._rings) + self._cuts.value
+
+    def empty(self):
+        """
+        True if the inbox has no messages, otherwise False
+        """
+        return self.qsize() == 0
+
+    def full(self):
+        """
+        True if every mailbox has maxsize messages, otherwise False
+        """
+        return all(ring.full() for ring in self._rings)
+
+    def _put_cut(self):
+        with self._condition:
+            self._cuts.value += 1
+            self._condition.notify_all()
+
+    def _note(self, picked, message):
+        """
+        notes that this thread took message, or each message of a chunk, from the mailbox at position picked
+        """
+        from .caine import _Chunk
+        taken = getattr(self._local, 'taken', None)
+        if taken is None: taken = self._local.taken = collections.deque(maxlen = _returnable)
+        num = len(message.messages) if type(message) is _Chunk else 1
+        if taken and taken[-1][0] == picked: taken[-1][1] += num                   # Messages taken in a row from the same mailbox are noted as a run.
+        else: taken.append([picked, num])
+
+    def _pick(self, ready):
+        """
+        returns the position of the mailbox to take a message from among the positions of the mailboxes holding messages
+        """
+        if self.weights is None: return ready[0]                                            # By strict priority, take from the first mailbox holding messages.
+        total = sum(self._weights[i] for i in ready)                                        # By weighted fair share, every mailbox holding messages is owed its weight,
+        for i in ready: self._credit[i] += self._weights[i]
+        picked = max(ready, key = lambda i: (self._credit[i], -i))                          # the one owed the most is picked, the first on ties,
+        self._credit[picked] -= total                                                       # and pays back what all were owed, so that each gets its share in turn.
+        return picked
+
+class Mailbox(object):
+    """
+    Queue putting messages in a mailbox of a caine.PriorityInbox, returned by caine.PriorityInbox.mailbox.
+    Messages are gotten from the whole inbox.
+
+    Parameters
+    __________
+    inbox : caine.PriorityInbox
+        The inbox
+    name : str
+        The name of the mailbox
+    """
+    def __init__(self, inbox, name):
+        self.inbox = inbox
+        self.name = name
+
+    def put(self, message, block = True, timeout = None):
+        """
+        puts message in the mailbox
+        """
+        self.inbox.put_in(self.name, message, block, timeout)
+
+    def get(self, block = True, timeout = None):
+        """
+        removes and returns the next message from the inbox
+        """
+        return self.inbox.get(block, timeout)
+
+    def put_back(self, messages):
+        """
+        returns messages taken by this thread but not received to the mailboxes of the inbox they were taken from, as caine.PriorityInbox.put_back
+        """
+        self.inbox.put_back(messages)
+
+    def ack(self):
+        """
+        forgets the mailboxes of the messages taken by this thread, as caine.PriorityInbox.ack
+        """
+        self.inbox.ack()
+
+    def put_nowait(self, message):
+        """
+        puts message in the mailbox if there is room, otherwise raises Queue.Full
+        """
+        self.put(message, False)
+
+    def get_nowait(self):
+        """
+        removes and returns the next message from the inbox if there is one, otherwise raises Queue.Empty
+        """
+        return self.get(False)
+
+    def qsize(self):
+        """
+        the number of messages in the mailbox
+        """
+        return self.inbox.depths()[self.name]
+
+    def empty(self):
+        """
+        True if the mailbox has no messages, otherwise False
+        """
+        return self.qsize() == 0
+
+    def full(self):
+        """
+        True if the mailbox has maxsize messages, otherwise False
+        """
+        return self.inbox._rings[self.inbox._index[self.name]].full()
+
+class DurableInbox(object):
+    """
+    Inbox appending messages to memory-mapped segment files in a directory on local disk, usable in place of the default inbox of a SupportingActor.
+    Messages are read back from the files in order, so that however many messages wait, each process maps into memory only the segment it writes and the one it reads,
+    and files are deleted once every message in them is acknowledged.
+    Actors acknowledge messages once they are received, a Collector once it has collected every message, and an AsyncActor once they are handed to its threads.
+    Messages taken but not acknowledged by a process that died, such as an actor restarted by a SupportingCast, are returned to the inbox by reclaim,
+    and all messages taken but not acknowledged are received again when inbox reception restarts, or by a DurableInbox created later on the same directory,
+    so that they are received at least once.
+    Cut is not written to disk, and is received once the inbox is empty.
+    A DurableInbox is shared with processes started after it is created.
+
+    Parameters
+    __________
+    path : str
+        The directory holding the segment files, created if it does not exist
+    maxsize : int or None, default None
+        If not None, the maximum number of messages in the inbox, otherwise messages wait on disk without limit
+    segment_bytes : int, default 67108864
+        The number of bytes of each segment file, the largest message that fits in the inbox
+    sync : boolean, default False
+        If True, each message is flushed to disk as it is put, so that messages survive the machine going down,
+        otherwise messages are written to disk by the operating system in its own time and survive only the death of processes
+    codec : caine.Codec or None, default None
+        If not None, the codec encoding messages, such as a caine.BufferCodec
+    """
+    def __init__(self, path, maxsize = None, segment_bytes = 2 ** 26, sync = False, codec = None):
+        if not os.path.isdir(path): os.makedirs(path)
+        self.path = path                                                            # The directory holding the segment files.
+        self.maxsize = maxsize or 0                                                 # The maximum number of messages, where 0 means there is no maximum.
+        self.segment_bytes = segment_bytes                                          # The number of bytes of each segment file.
+        self.sync = sync                                                            # Whether each message is flushed to disk as it is put.
+        self.codec = codec                                                          # The codec encoding messages, if any.
+        self._segments = {}                                                         # The segment files mapped into memory by this process, by index,
+        self._addresses = {}                                                        # and the addresses they are mapped at.
+        self._local = threading.local()                                             # The in flight slot held by this thread, if any.
+        state = open(os.path.join(path, 'commit'), 'a+b')                           # The offset before which every message is acknowledged is kept on disk,
+        if os.path.getsize(state.name) < _offset.size: state.write('\0' * _offset.size)
+        state.flush()
+        self._state = mmap.mmap(state.fileno(), _offset.size)                       # mapped into memory.
+        state.close()
+        commit = _offset.unpack(self._state[:_offset.size])[0]
+        self._commit = multiprocessing.RawValue(ctypes.c_ulonglong, commit)         # The offset before which every message is acknowledged.
+        self._head = multiprocessing.RawValue(ctypes.c_ulonglong, commit)           # The offset of the next message to read, starting with the first not acknowledged.
+        self._tail = multiprocessing.RawValue(ctypes.c_ulonglong, commit)           # The offset of the next message to write.
+        self._count = multiprocessing.RawValue('i', 0)                              # The number of messages in the inbox.
+        self._cuts = multiprocessing.RawValue('i', 0)                               # The number of Cuts in the inbox.
+        self._inflight = multiprocessing.RawArray(ctypes.c_ulonglong, _slots)       # For each slot held by a thread taking messages, one more than the offset of the first it has not acknowledged, or 0,
+        self._owners = multiprocessing.RawArray('i', _slots)                        # the process of the thread,
+        self._taken = multiprocessing.RawArray(ctypes.c_ulonglong, _slots * _slot_messages)    # the offsets of the messages it has not acknowledged,
+        self._taken_count = multiprocessing.RawArray('i', _slots)                   # and how many there are.
+        self._condition = multiprocessing.Condition()                               # Guards the offsets, count and slots, and is notified whenever they change.
+        self._tail.value, self._count.value = self._scan(commit)                    # Find the messages left on disk.
+
+    def put(self, message, block = True, timeout = None):
+        """
+        appends message to the inbox
+
+        Parameters
+        __________
+        message : object
+            The message
+        block : boolean, default True
+            If True, wait for room in the inbox, otherwise raise Queue.Full at once if there is none
+        timeout : float or None, default None
+            If not None, the maximum number of seconds to wait for room before raising Queue.Full
+        """
+        if _is_cut(message):                                                        # Cut is counted rather than written.
+            with self._condition:
+                self._cuts.value += 1
+                self._condition.notify_all()
+            return
+        kind, parts = _encode(message, self.codec)                                  # Get the kind of message and the objects holding its bytes.
+        size = _header.size + sum(len(part) for part in parts)                      # Get the number of bytes to write.
+        if size > self.segment_bytes:                                               # If the message can never fit in a segment file,
+            raise ValueError("Message of %s bytes exceeds segment size of %s bytes." %(size, self.segment_bytes))
+        deadline = None if timeout is None else time.time() + timeout               # Find when to stop waiting for room, if ever.
+        with self._condition:                                                       # With the inbox locked:
+            while 0 < self.maxsize <= self._count.value:                            # While the inbox is full,
+                _wait(self._condition, block, deadline, Queue.Full)                 # wait for a message to be read.
+            self._append(kind, parts, size)                                         # Write the message at the tail,
+            self._count.value += 1                                                  # count it,
+            self._condition.notify_all()                                            # and wake anyone waiting for it.
+
+    def get(self, block = True, timeout = None):
+        """
+        removes and returns a message from the inbox, which is in flight until acknowledged by the thread taking it
+
+        Parameters
+        __________
+        block : boolean, default True
+            If True, wait for a message to arrive, otherwise raise Queue.Empty at once if there is none
+        timeout : float or None, default None
+            If not None, the maximum number of seconds to wait for a message before raising Queue.Empty
+        """
+        from .caine import Cut
+        deadline = None if timeout is None else time.time() + timeout               # Find when to stop waiting for a message, if ever.
+        with self._condition:                                                       # With the inbox locked:
+            while True:
+                if self._count.value == 0 and self._cuts.value:                     # If the inbox is empty but there is Cut,
+                    self._cuts.value -= 1                                           # take it.
+                    return Cut
+                slot = getattr(self._local, 'slot', None)                           # Messages are taken under a slot held until they are acknowledged,
+                if slot is None: slot = self._free_slot()
+                if slot is None and self.reclaim(): continue                        # freeing the slots of processes that died if none is free,
+                if self._count.value and slot is not None: break
+                _wait(self._condition, block, deadline, Queue.Empty)                # waiting for a message, or a free slot if there is none.
+            head, size, kind = self._message(self._head.value)                      # Read the header of the message at the head.
+            if not self._inflight[slot]:                                            # Hold the slot from the first message taken.
+                self._inflight[slot] = head + 1
+                self._owners[slot] = os.getpid()
+                self._taken_count[slot] = 0
+            taken = self._taken_count[slot]                                         # Note the offset of the message in the slot, if there is room.
+            if taken < _slot_messages: self._taken[slot * _slot_messages + taken] = head
+            self._taken_count[slot] = taken + 1
+            self._local.slot = slot
+            if kind == _ENCODED: payload = self._read_parts(head + _header.size)    # Read the message itself,
+            else: payload = self._read(head + _header.size, size, bytearray if kind == _BYTEARRAY else str)
+            self._head.value = head + _header.size + size                           # move the head past the message,
+            self._unmap()                                                           # unmap the segment read before if the head left it,
+            self._count.value -= 1                                                  # stop counting it,
+            self._condition.notify_all()                                            # and wake anyone waiting for room.
+        return _decode(kind, payload, self.codec)                                   # Decode or unpickle the message outside the lock.
+
+    def ack(self):
+        """
+        acknowledges every message taken by this thread, so that they are not received again
+        """
+        slot = getattr(self._local, 'slot', None)
+        if slot is None: return
+        with self._condition:
+            self._inflight[slot] = 0                                                # Free the slot held,
+            self._local.slot = None
+            self._acknowledged()                                                    # and move on the offset before which every message is acknowledged.
+            self._condition.notify_all()
+
+    def reclaim(self):
+        """
+        returns the messages taken but not acknowledged by processes that died to the inbox, to be received again, and frees the slots they held,
+        returning the number of slots freed. Called by a SupportingCast when it restarts an actor whose process died, and when no slot is free.
+        """
+        with self._condition:
+            dead = [slot for slot in xrange(_slots) if self._inflight[slot] and not _alive(self._owners[slot])]
+            for slot in dead:
+                taken = self._taken_count[slot]                                     # Find the messages of the slot,
+                if taken <= _slot_messages: offsets = self._taken[slot * _slot_messages:slot * _slot_messages + taken]
+                else: offsets = self._offsets(self._inflight[slot] - 1, self._head.value)   # or every message since its first if there were too many to note.
+                for offset in offsets:                                              # Append a copy of each to the inbox,
+                    offset, size, kind = self._message(offset)
+                    self._append(kind, [self._read(offset + _header.size, size, str)], _header.size + size)
+                    self._count.value += 1
+                self._inflight[slot] = 0                                            # and free the slot.
+            if dead:
+                self._acknowledged()
+                self._condition.notify_all()
+            return len(dead)
+
+    def replay(self):
+        """
+        returns every message in flight to the inbox, to be received again in order. Called when inbox reception starts.
+        """
+        with self._condition:
+            for slot in xrange(_slots): self._inflight[slot] = self._taken_count[slot] = 0     # Free every slot,
+            self._local.slot = None
+            self._head.value = self._commit.value                                   # and read again from the first message not acknowledged.
+            self._count.value = self._scan(self._commit.value)[1]
+            self._condition.notify_all()
+
+    def put_nowait(self, message):
+        """
+        appends message to the inbox if there is room, otherwise raises Queue.Full
+        """
+        self.put(message, False)
+
+    def get_nowait(self):
+        """
+        removes and returns a message from the inbox if there is one, otherwise raises Queue.Empty
+        """
+        return self.get(False)
+
+    def qsize(self):
+        """
+        the number of messages in the inbox
+        """
+        return self._count.value + self._cuts.value
+
+    def empty(self):
+        """
+        True if the inbox has no messages, otherwise False
+        """
+        return self.qsize() == 0
+
+    def full(self):
+        """
+        True if the inbox has maxsize messages, otherwise False
+        """
+        return 0 < self.maxsize <= self._count.value
+
+    def _free_slot(self):
+        for slot in xrange(_slots):
+            if not self._inflight[slot]: return slot
+        return None
+
+    def _append(self, kind, parts, size):
+        """
+        writes a message of the kind given held by parts, of size bytes with its header, at the tail, and moves the tail past it. Called with the inbox locked.
+        """
+        tail = self._tail.value
+        if tail % self.segment_bytes + size > self.segment_bytes:                   # If the message does not fit in the rest of the segment,
+            if self.segment_bytes - tail % self.segment_bytes >= _header.size:      # mark the rest as unused,
+                self._write(tail, [_header.pack(0, _SKIP)])
+            tail += self.segment_bytes - tail % self.segment_bytes                  # and write at the start of the next segment.
+        self._write(tail + _header.size, parts)                                     # Write the message before its header,
+        self._write(tail, [_header.pack(size - _header.size, kind)])                # so that a message written in part is never read.
+        if self.sync: self._segment(tail // self.segment_bytes).flush()
+        self._tail.value = tail + size                                              # Move the tail past the message,
+        self._unmap()                                                               # and unmap the segment written before if the tail left it.
+
+    def _message(self, offset):
+        """
+        returns the offset, size and kind of the message at offset, or at the start of the next segment if none fits in the rest of the segment
+        """
+        if offset % self.segment_bytes + _header.size <= self.segment_bytes:
+            size, kind = _header.unpack(self._read(offset, _header.size, str))
+            if kind != _SKIP: return offset, size, kind
+        offset += self.segment_bytes - offset % self.segment_bytes
+        size, kind = _header.unpack(self._read(offset, _header.size, str))
+        return offset, size, kind
+
+    def _offsets(self, start, end):
+        """
+        returns the offsets of the messages from start up to end
+        """
+        offsets = []
+        while start < end:
+            start, size, kind = self._message(start)
+            if start >= end: break
+            offsets.append(start)
+            start += _header.size + size
+        return offsets
+
+    def _acknowledged(self):
+        """
+        moves the offset before which every message is acknowledged up to the first message in flight, or the head if there is none
+        """
+        starts = [start for start in self._inflight if start]
+        commit = min(starts) - 1 if starts else self._head.value
+        if commit > self._commit.value: self._advance(commit)
+
+    def _advance(self, commit):
+        """
+        records on disk that every message before commit is acknowledged, deleting the segment files before the one holding it
+        """
+        first, last = self._commit.value // self.segment_bytes, commit // self.segment_bytes
+        self._commit.value = commit
+        self._state[:_offset.size] = _offset.pack(commit)
+        if self.sync: self._state.flush()
+        for index in xrange(first, last):
+            try: os.remove(self._segment_path(index))
+            except OSError: pass
+
+    def _scan(self, offset):
+        """
+        returns the offset after the last message written from offset on, and the number of messages from offset on
+        """
+        count = 0
+        while os.path.exists(self._segment_path(offset // self.segment_bytes)):
+            if offset % self.segment_bytes + _header.size > self.segment_bytes:     # Past the end of a segment,
+                offset += self.segment_bytes - offset % self.segment_bytes          # go on to the next.
+                continue
+            size, kind = _header.unpack(self._read(offset, _header.size, str))
+            if kind == _SKIP:
+                offset += self.segment_bytes - offset % self.segment_bytes
+            elif size or kind:                                                      # Count each message written,
+                offset += _header.size + size
+                count += 1
+            else: break                                                             # up to the first header not written.
+        return offset, count
+
+    def _segment_path(self, index):
+        return os.path.join(self.path, '%016x.seg' %(index))
+
+    def _segment(self, index):
+        """
+        returns the segment file with the index given mapped into memory, creating it if it does not exist,
+        and unmapping every other segment file but those holding the head and the tail
+        """
+        if index not in self._segments:
+            self._unmap(index)
+            segment = open(self._segment_path(index), 'a+b')
+            if os.path.getsize(segment.name) < self.segment_bytes: segment.truncate(self.segment_bytes)  # A new segment file is all zeros, without using disk.
+            self._segments[index] = mmap.mmap(segment.fileno(), self.segment_bytes)
+            segment.close()
+        return self._segments[index]
+
+    def _unmap(self, keep = None):
+        """
+        unmaps the segment files mapped by this process but those holding the head and the tail, and the one with the index keep if not None
+        """
+        kept = (self._head.value // self.segment_bytes, self._tail.value // self.segment_bytes, keep)
+        for index in [index for index in self._segments if index not in kept]:
+            self._segments.pop(index).close()
+            self._addresses.pop(index, None)
+
+    def _address(self, offset):
+        index = offset // self.segment_bytes
+        if index not in self._segments or index not in self._addresses:                     # Find where the segment is mapped in memory,
+            self._addresses[index] = ctypes.addressof(ctypes.c_char.from_buffer(self._segment(index)))
+        return self._addresses[index] + offset % self.segment_bytes                         # and the address of the offset within it.
+
+    def _write(self, offset, parts):
+        address = self._address(offset)
+        for part in parts:
+            ctypes.memmove(address, part, len(part))
+            address += len(part)
+
+    def _read(self, offset, size, kind):
+        address = self._address(offset)
+        if kind is str: return ctypes.string_at(address, size)
+        payload = bytearray(size)
+        ctypes.memmove(ctypes.addressof((ctypes.c_char * size).from_buffer(payload)), address, size)
+        return payload
+
+    def _read_parts(self, offset):
+        count = _count.unpack(self._read(offset, _count.size, str))[0]                      # Read the number of buffers handed over out of band,
+        offset += _count.size
+        lengths = [_length.unpack(self._read(offset + i * _length.size, _length.size, str))[0] for i in xrange(count + 1)]
+        offset += (count + 1) * _length.size                                                # the length of each part,
+        parts = [self._read(offset, lengths[0], str)]                                       # the str encoded by the codec,
+        offset += lengths[0]
+        for length in lengths[1:]:                                                          # and each buffer into a bytearray.
+            parts.append(self._read(offset, length, bytearray))
+            offset += length
+        return parts
+
+def _encode(message, codec = None):
+    """
+    returns the kind of message and a list of strs or ctypes arrays holding its bytes
+    """
+    if codec is not None:
+        from .caine import Cut, _Chunk, _Expiring
+        if message is not Cut and type(message) not in (_Chunk, _Expiring):                 # With a codec, messages are encoded by the codec,
+            encoded = codec.encode(message)
+            data, buffers = encoded if type(encoded) is tuple else (encoded, [])
+            parts = [data] + [_writable(buf) for buf in buffers]                            # with buffers handed over out of band written as they are,
+            lengths = ''.join(_length.pack(len(part)) for part in parts)
+            return _ENCODED, [_count.pack(len(buffers)) + lengths] + parts                  # after the number of buffers and the length of each part.
+        message = _encode_message(codec, message)                                           # Cut, and chunks and holders of encoded messages, are pickled.
+    elif type(message) is str: return _STR, [message]                                       # strs are written as they are.
+    elif type(message) is bytearray:                                                        # bytearrays are written as they are.
+        return _BYTEARRAY, [(ctypes.c_char * len(message)).from_buffer(message)]
+    elif not isinstance(message, (basestring, buffer, memoryview)):                         # Other objects, except strings and read only buffers,
+        try: return _BYTEARRAY, [(ctypes.c_char * len(buffer(message))).from_buffer(message)] # are written as they are if they expose a writable buffer,
+        except TypeError: pass
+    return _PICKLED, [cPickle.dumps(message, cPickle.HIGHEST_PROTOCOL)]                     # otherwise they are pickled.
+
+def _decode(kind, payload, codec = None):
+    """
+    returns the message of the kind given held by the bytes read from an inbox
+    """
+    if kind == _ENCODED: return codec.decode(payload[0], payload[1:])
+    if kind == _PICKLED:
+        message = cPickle.loads(payload)
+        return _decode_message(codec, message) if codec is not None else message
+    return payload
+
+def _writable(buf):
+    """
+    returns a str or ctypes array holding the bytes of a buffer, copying them only if the buffer is read only
+    """
+    if type(buf) is str: return buf
+    try: return (ctypes.c_char * len(buffer(buf))).from_buffer(buf)
+    except TypeError: return str(buffer(buf))
+
+def _is_cut(message):
+    from .caine import Cut
+    return message is Cut
+
+def _routed(message):
+    """
+    returns the message a chunk or message holder is routed by, the first message of a chunk or the message held
+    """
+    from .caine import _Chunk, _Expiring
+    if type(message) is _Expiring: return message.message
+    if type(message) is _Chunk and message.messages: return message.messages[0]
+    return message
+
+def _alive(pid):
+    """
+    True if the process with the id given is running, otherwise False
+    """
+    try: os.kill(pid, 0)
+    except OSError: return False
+    return True
+
+def _wait(condition, block, deadline, exc):
+    """
+    waits on condition until notified or deadline, raising exc if not blocking or past deadline
+    """
+    if not block: raise exc()
+    if deadline is None: return condition.wait()
+    remaining = deadline - time.time()
+    if remaining <= 0: raise exc()
+    condition.wait(remaining)
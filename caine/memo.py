@@ -0,0 +1,208 @@
+import multiprocessing
+import functools
+import ctypes
+import struct
+import cPickle
+import math
+import os
+import thread
+from .caine import _mix, _monotonic, _wake_secs
+from .inbox import _alive
+
+_ways = 8                                               # The number of entries in each set, among which the least recently used is evicted.
+_stripes = 16                                           # The number of locks guarding the sets.
+_sizes = struct.Struct('<II')                           # Each entry starts with the number of bytes of its pickled key and of its pickled result.
+_EMPTY, _COMPUTING, _READY = range(3)                   # The states of an entry: unused, holding a key whose result is being computed, and holding a result.
+_counters = ['hits', 'misses', 'coalesced', 'evictions', 'too_large']
+
+class Memo(object):
+    """
+    Cache of the results of a function shared through shared memory by the processes started after it is created, such as the actors of a caine.SupportingCast.
+    Used as a decorator of a function, such as receive, whose first argument is a message, the result for a message is computed once and then returned
+    without calling the function, until it is evicted. While the result for a key is being computed, others asking for it wait for it rather than compute it too.
+    Results are pickled, and only as many bytes as capacity allows for each result are kept. Note that a function returning the result of a message
+    from the cache is not called, so any other effect of calling it does not happen.
+
+    Parameters
+    __________
+    maxsize : int, default 1024
+        The maximum number of results kept, where the least recently used result of those with keys of similar hashes is evicted first
+    ttl : float or None, default None
+        If not None, the number of seconds a result is kept
+    key : function or None, default None
+        If not None, called with each message, returning the hashable key its result is kept by, otherwise the message is the key
+    capacity : int, default 4194304
+        The number of bytes of shared memory holding keys and results, shared equally by the entries
+    """
+    def __init__(self, maxsize = 1024, ttl = None, key = None, capacity = 2 ** 22):
+        self.ttl = ttl
+        self.key = key
+        self._sets = int(math.ceil(maxsize / float(_ways)))                                 # The number of sets of entries.
+        self.maxsize = self._sets * _ways                                                   # The number of entries.
+        self._entry_bytes = capacity // self.maxsize                                        # The number of bytes holding the key and result of each entry.
+        if self._entry_bytes <= _sizes.size: raise ValueError("Capacity of %s bytes is too small for %s entries." %(capacity, self.maxsize))
+        self._data = multiprocessing.RawArray(ctypes.c_char, self._entry_bytes * self.maxsize)   # The keys and results.
+        self._address = ctypes.addressof(self._data)
+        self._hashes = multiprocessing.RawArray(ctypes.c_ulonglong, self.maxsize)            # The hash of the key of each entry,
+        self._states = multiprocessing.RawArray('i', self.maxsize)                          # its state,
+        self._owners = multiprocessing.RawArray('i', self.maxsize)                          # the process computing its result,
+        self._threads = multiprocessing.RawArray(ctypes.c_long, self.maxsize)               # the thread of that process computing it,
+        self._used = multiprocessing.RawArray('d', self.maxsize)                            # when its result was last used,
+        self._expires = multiprocessing.RawArray('d', self.maxsize)                         # and when it expires, or 0 if never.
+        self._counters = multiprocessing.RawArray(ctypes.c_ulonglong, len(_counters))      # The number of hits, misses, coalesced waits, evictions, and results too large to keep,
+        self._counting = multiprocessing.Lock()                                             # guarded by a lock of their own, as they are counted under the locks of every set.
+        self._conditions = [multiprocessing.Condition() for _ in xrange(_stripes)]         # Guard the sets, and are notified whenever a result is kept or given up on.
+
+    def __call__(self, func):
+        """
+        returns func with its results kept in the cache by the key of its first argument
+        """
+        @functools.wraps(func)
+        def memoized(message, *args, **kwargs):
+            key = self.key(message) if self.key is not None else message
+            return self.get(key, lambda: func(message, *args, **kwargs))
+        return memoized
+
+    def get(self, key, compute):
+        """
+        returns the result kept for key, otherwise calls compute and keeps its result for key,
+        waiting for the result instead if another thread or process is already computing it
+
+        Parameters
+        __________
+        key : object
+            The hashable key of the result
+        compute : function
+            Called without arguments to compute the result if it is not kept
+        """
+        hashed = _mix(hash(key))                                                            # Find the hash of the key,
+        pickled = cPickle.dumps(key, cPickle.HIGHEST_PROTOCOL)                              # the key as it is kept,
+        first = (hashed % self._sets) * _ways                                               # the first entry of the set the key belongs to,
+        condition = self._conditions[(hashed % self._sets) % _stripes]                      # and the lock guarding the set.
+        waited = False
+        with condition:
+            while True:
+                entry = self._find(first, hashed, pickled)
+                if entry is None: break                                                     # If the key is not kept, compute its result.
+                if self._states[entry] == _READY:                                           # If its result is kept, use it.
+                    self._used[entry] = _monotonic()
+                    self._count('hits')
+                    return cPickle.loads(self._read(entry)[1])
+                if self._owned(entry) or not _alive(self._owners[entry]):                   # If the process computing its result died, or this thread is computing it, compute it instead.
+                    self._states[entry] = _EMPTY
+                    break
+                if not waited: self._count('coalesced')                                     # Otherwise wait for the result.
+                waited = True
+                condition.wait(_wake_secs)
+            entry = self._claim(first, hashed, pickled)                                     # Hold an entry for the key while its result is computed, if one is free.
+            self._count('misses')
+        try: result = compute()
+        except:                                                                             # If computing the result fails, give up the entry so that others compute it.
+            if entry is not None: self._release(condition, entry, hashed)
+            raise
+        if entry is not None: self._keep(condition, entry, hashed, pickled, result)
+        return result
+
+    def stats(self):
+        """
+        dict of the number of hits, misses, waits for results being computed (coalesced), evictions, and results too large to keep,
+        and the number of results kept (size)
+        """
+        with self._counting: stats = dict((name, int(self._counters[i])) for i, name in enumerate(_counters))
+        now = _monotonic()
+        stats['size'] = sum(1 for entry in xrange(self.maxsize) if self._states[entry] == _READY and not self._expired(entry, now))
+        return stats
+
+    def clear(self):
+        """
+        evicts every result kept
+        """
+        for condition in self._conditions: condition.acquire()
+        try:
+            for entry in xrange(self.maxsize):
+                if self._states[entry] == _READY: self._states[entry] = _EMPTY
+        finally:
+            for condition in self._conditions: condition.release()
+
+    def _find(self, first, hashed, pickled):
+        """
+        returns the entry of the set starting at first holding the key, or None if it is not kept, dropping it if it expired
+        """
+        now = _monotonic()
+        for entry in xrange(first, first + _ways):
+            if self._states[entry] == _EMPTY or self._hashes[entry] != hashed: continue
+            if self._read(entry)[0] != pickled: continue                                    # Keys with the same hash are told apart by their pickles.
+            if self._states[entry] == _READY and self._expired(entry, now):
+                self._states[entry] = _EMPTY
+                return None
+            return entry
+        return None
+
+    def _claim(self, first, hashed, pickled):
+        """
+        returns an entry of the set starting at first holding the key while its result is computed, evicting the least recently used result if none is empty,
+        or None if every entry is held while results are computed
+        """
+        now = _monotonic()
+        candidates = [entry for entry in xrange(first, first + _ways) if self._states[entry] != _COMPUTING]
+        if not candidates: return None
+        empty = [entry for entry in candidates if self._states[entry] == _EMPTY or self._expired(entry, now)]
+        entry = empty[0] if empty else min(candidates, key = lambda entry: self._used[entry])
+        if not empty: self._count('evictions')
+        self._hashes[entry] = hashed
+        self._states[entry] = _COMPUTING
+        self._owners[entry] = os.getpid()
+        self._threads[entry] = thread.get_ident()
+        self._write(entry, pickled, '')
+        return entry
+
+    def _keep(self, condition, entry, hashed, pickled, result):
+        """
+        keeps the result in the entry held while it was computed, unless it is too large, and wakes those waiting for it
+        """
+        value = cPickle.dumps(result, cPickle.HIGHEST_PROTOCOL)
+        with condition:
+            if self._states[entry] != _COMPUTING or self._hashes[entry] != hashed or not self._owned(entry): return
+            if _sizes.size + len(pickled) + len(value) > self._entry_bytes:                 # If the result does not fit in the entry, give it up.
+                self._count('too_large')
+                self._states[entry] = _EMPTY
+            else:
+                self._write(entry, pickled, value)
+                self._used[entry] = _monotonic()
+                self._expires[entry] = _monotonic() + self.ttl if self.ttl is not None else 0.
+                self._states[entry] = _READY
+            condition.notify_all()
+
+    def _release(self, condition, entry, hashed):
+        with condition:
+            if self._states[entry] == _COMPUTING and self._hashes[entry] == hashed and self._owned(entry):
+                self._states[entry] = _EMPTY
+            condition.notify_all()
+
+    def _owned(self, entry):
+        """
+        True if this thread is computing the result of an entry, otherwise False
+        """
+        return self._owners[entry] == os.getpid() and self._threads[entry] == thread.get_ident()
+
+    def _expired(self, entry, now):
+        return 0. < self._expires[entry] <= now
+
+    def _count(self, name):
+        with self._counting: self._counters[_counters.index(name)] += 1
+
+    def _write(self, entry, pickled, value):
+        if _sizes.size + len(pickled) + len(value) > self._entry_bytes: pickled = ''       # A key too large to keep never matches, so its result is computed but not kept.
+        address = self._address + entry * self._entry_bytes
+        ctypes.memmove(address, _sizes.pack(len(pickled), len(value)), _sizes.size)
+        ctypes.memmove(address + _sizes.size, pickled, len(pickled))
+        ctypes.memmove(address + _sizes.size + len(pickled), value, len(value))
+
+    def _read(self, entry):
+        """
+        returns the pickled key and result of an entry
+        """
+        address = self._address + entry * self._entry_bytes
+        key_bytes, value_bytes = _sizes.unpack(ctypes.string_at(address, _sizes.size))
+        return (ctypes.string_at(address + _sizes.size, key_bytes),
+                ctypes.string_at(address + _sizes.size + key_bytes, value_bytes))
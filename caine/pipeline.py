@@ -0,0 +1,179 @@
+from .caine import SupportingActor, SupportingCast, Collector, Cut, _callback, _monotonic
+
+class Stage(object):
+    """
+    Step of a caine.Pipeline, transforming each message passed on by the step before it.
+
+    Parameters
+    __________
+    transform : function
+        Called with a message and the attributes of the stage, returning the message passed on to the next stage, or None to pass nothing on
+    num : int, default 1
+        Number of actor processes running the stage, where messages may be passed on out of order if more than 1
+    maxsize : int or None, default None
+        If not None, the maximum number of messages waiting for the stage, otherwise the maxsize of the pipeline
+    fuse : boolean, default False
+        If True, the stage runs in the processes of the stage before it, passing messages on without an inbox in between.
+        Ignored for the first stage, and num and maxsize of a fused stage are ignored.
+    inbox : queue or None, default None
+        If not None, the inbox to use in place of a multiprocessing.Manager().Queue, such as a caine.RingInbox
+    kwargs : object
+        Additional keyword arguments are attributes of the stage
+    """
+    def __init__(self, transform, num = 1, maxsize = None, fuse = False, inbox = None, **kwargs):
+        self.transform = transform
+        self.num = num
+        self.maxsize = maxsize
+        self.fuse = fuse
+        self.inbox = inbox
+        self.attributes = kwargs
+
+class Pipeline(object):
+    """
+    Data structure with operations for passing objects put in its inbox through a chain of stages, each run by actors of its own.
+    Stages are connected by inboxes of bounded size, so that a slow stage holds back the stages before it and whoever puts messages in the pipeline.
+    Cut put in the inbox of the pipeline is passed from stage to stage once each is done, and callback is executed once the last stage is done.
+
+    Parameters
+    __________
+    stages : list of caine.Stage or function
+        The stages, in order, where a function is a caine.Stage with that transform
+    collect : function or None, default None
+        If not None, the messages passed on by the last stage are collected as by a caine.Collector
+    callback : function
+        Called with the instance attributes of the last actor once the pipeline is done
+    maxsize : int or None, default 1000
+        The maximum number of messages waiting for each stage, unless the stage sets its own
+    """
+    def __init__(self, stages, collect = None, callback = _callback, maxsize = 1000):
+        stages = [stage if isinstance(stage, Stage) else Stage(stage) for stage in stages]         # Functions are stages with default options.
+        if not stages: raise ValueError("A pipeline needs at least one stage.")
+        groups = []                                                                                 # Stages running in the same processes are grouped,
+        for i, stage in enumerate(stages):
+            if stage.fuse and i > 0: groups[-1].append(stage)                                       # with a fused stage joining the group before it.
+            else: groups.append([stage])
+        self._actors = []                                                                           # The actors running each group, with the collector if there is one.
+        outbox = None                                                                               # The inbox messages passed on by the last group are put in, if any.
+        if collect is not None:
+            self._actors.append(Collector(collect = collect, callback = callback, maxsize = maxsize))
+            outbox = self._actors[0].inbox
+        for i, group in enumerate(reversed(groups)):                                                # Set up the actors of each group from the last to the first, so that each knows its outbox.
+            last = (i == 0 and collect is None)
+            actor_class = SupportingCast if group[0].num > 1 else SupportingActor
+            options = {'num' : group[0].num} if group[0].num > 1 else {'handle' : _handle_stage}   # Exceptions are reported without stopping the pipeline.
+            actor = actor_class(receive = _pipe, callback = callback if last else _relay_cut,       # Every group but the last passes Cut on once it is done.
+                                inbox = group[0].inbox, maxsize = group[0].maxsize or maxsize,
+                                transforms = [(stage.transform, stage.attributes) for stage in group],
+                                outbox = outbox, **options)
+            self._actors.insert(0, actor)
+            outbox = actor.inbox
+        self._collects = collect is not None
+
+    @property
+    def inbox(self):
+        """
+        the inbox of the first stage
+        """
+        return self._actors[0].inbox
+
+    @property
+    def actors(self):
+        """
+        list of the actors running the stages, in order, followed by the caine.Collector if messages are collected
+        """
+        return list(self._actors)
+
+    @property
+    def process(self):
+        """
+        the process of the last actor, which is done once the pipeline is done
+        """
+        return self._actors[-1].process
+
+    @property
+    def collected(self):
+        """
+        all collected messages if messages are collected and the pipeline is done, otherwise None
+        """
+        return self._actors[-1].collected if self._collects else None
+
+    def put(self, message, ttl = None):
+        """
+        puts message in the inbox of the first stage, waiting while it is full, as caine.SupportingActor.put
+        """
+        self._actors[0].put(message, ttl)
+
+    def put_many(self, messages, chunksize = 1000, ttl = None):
+        """
+        puts messages in the inbox of the first stage in chunks, as caine.SupportingActor.put_many
+        """
+        self._actors[0].put_many(messages, chunksize, ttl)
+
+    def feed(self, messages, chunksize = 1000, cut = False, ttl = None):
+        """
+        puts messages in the inbox of the first stage in chunks from a separate thread, as caine.SupportingActor.feed
+        """
+        return self._actors[0].feed(messages, chunksize, cut, ttl)
+
+    def cut(self, immediate = False):
+        """
+        ends processing
+
+        Parameters
+        __________
+        immediate : boolean, default False
+            If True, every stage is ended in place, otherwise each stage ends once it has passed on every message before Cut
+        """
+        if immediate:
+            for actor in self._actors: actor.cut(immediate = True)
+        else: self._actors[0].cut()                                                                 # Cut is passed on from stage to stage.
+
+    def join(self, timeout = None):
+        """
+        blocks until every stage is done, or for at most timeout seconds if timeout is not None
+        """
+        deadline = None if timeout is None else _monotonic() + timeout
+        for actor in self._actors:
+            actor.join(None if deadline is None else max(0., deadline - _monotonic()))
+
+    def wait(self, timeout = None):
+        """
+        blocks until every stage is done, returning True if none is ongoing, otherwise False once timeout seconds passed
+        """
+        self.join(timeout)
+        return all(actor.wait(0) for actor in self._actors)
+
+    def stats(self):
+        """
+        list of the runtime metrics of each actor, in the order of caine.Pipeline.actors
+        """
+        return [actor.stats() for actor in self._actors]
+
+    def __call__(self):
+        """
+        begin passing messages put in inbox through the stages
+        """
+        for actor in reversed(self._actors): actor()                                                # Start the last stage first, so that each stage has somewhere to pass messages on to.
+
+def _pipe(message, instance_attributes):
+    """
+    passes message through the transforms of the stages run by an actor, then puts the result in the outbox
+    """
+    for transform, attributes in instance_attributes['transforms']:
+        message = transform(message, attributes)
+        if message is None: return                                                                  # A transform returning None passes nothing on.
+    if instance_attributes['outbox'] is not None: instance_attributes['outbox'].put(message)       # Wait while the next stage is full.
+
+def _relay_cut(instance_attributes):
+    """
+    passes Cut on to the next stage
+    """
+    instance_attributes['outbox'].put(Cut)
+
+def _handle_stage(exc, message, instance_attributes):
+    """
+    method called upon exception, reporting it while the stage keeps processing
+    """
+    print "Error for message:"
+    print message
+    print "Exception: %r" %(exc)
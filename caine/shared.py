@@ -0,0 +1,175 @@
+import cPickle
+import ctypes
+import struct
+import bisect
+import mmap
+from .caine import _point
+
+_count = struct.Struct('<Q')     # A SharedTable starts with the number of entries, followed by the sorted hashes of their keys, and where each entry starts and ends.
+_key_bytes = struct.Struct('<I') # Each entry starts with the number of bytes of its pickled key, followed by the pickled key and value.
+
+class SharedBuffer(object):
+    """
+    Read-only bytes held in shared memory, or in a file mapped into memory, that processes started after it is created,
+    such as the actors of a caine.SupportingCast given it as an attribute, read without each holding a copy.
+    A SharedBuffer backed by a file is pickled as its path, so that it may also be passed to other processes, which map the file again.
+
+    Parameters
+    __________
+    data : str, buffer or None, default None
+        If not None, the bytes held, written to path first if path is not None
+    path : str or None, default None
+        If not None, the file holding the bytes, which is mapped into memory
+    """
+    def __init__(self, data = None, path = None):
+        if data is None and path is None: raise ValueError("A SharedBuffer needs data, a path, or both.")
+        if path is not None:                                                            # If backed by a file,
+            if data is not None:                                                        # write the bytes to it if given,
+                with open(path, 'wb') as output: output.write(data)
+            with open(path, 'rb') as source:                                            # then map it, privately so that pages are read from the file until written, which they never are.
+                self._map = mmap.mmap(source.fileno(), 0, access = mmap.ACCESS_COPY)
+            self.nbytes = len(self._map)
+        else:                                                                           # Otherwise, copy the bytes once into anonymous shared memory.
+            self.nbytes = len(data)
+            self._map = mmap.mmap(-1, max(self.nbytes, 1))
+            self._map.write(data)
+        self.path = path
+
+    def __len__(self):
+        return self.nbytes
+
+    def __getitem__(self, index):
+        """
+        returns the bytes at index, an int or a slice, as a str
+        """
+        return self._map[index] if self.nbytes else ''[index]                         # Empty bytes are held in a map of one byte, as maps cannot be empty.
+
+    def __reduce__(self):
+        if self.path is None: raise TypeError("A SharedBuffer in shared memory is only shared with processes started after it is created.")
+        return (SharedBuffer, (None, self.path))
+
+    def buffer(self, offset = 0, size = None):
+        """
+        returns a read-only buffer over size bytes, or all bytes after offset if size is None, starting at offset, without copying them
+        """
+        return buffer(self._map, offset, self.nbytes - offset if size is None else size)
+
+    def array(self, dtype, shape = None, offset = 0):
+        """
+        returns a read-only numpy array of the dtype and shape given over the bytes starting at offset, without copying them.
+        If shape is None, the array is 1-dimensional and holds as many items as fit.
+        """
+        import numpy                                                                    # Imported here, as numpy is only needed for arrays.
+        dtype = numpy.dtype(dtype)
+        count = -1 if shape is None else int(numpy.prod(shape))
+        array = numpy.frombuffer(self.buffer(offset), dtype, count)                     # A read-only buffer gives a read-only array.
+        return array if shape is None else array.reshape(shape)
+
+class SharedTable(object):
+    """
+    Read-only mapping held in a caine.SharedBuffer, so that processes started after it is created, such as the actors of a caine.SupportingCast
+    given it as an attribute, look values up without each holding a copy of the mapping. Each value is unpickled when it is looked up.
+    Keys are found by the hash of their pickle, so keys are equal only if their pickles are, as is the case for strs, ints, and tuples of them.
+
+    Parameters
+    __________
+    mapping : dict or None, default None
+        If not None, the keys and values held, written to path first if path is not None
+    path : str or None, default None
+        If not None, the file holding the table, as written by an earlier SharedTable with that path, which is mapped into memory
+    """
+    def __init__(self, mapping = None, path = None):
+        if mapping is None and path is None: raise ValueError("A SharedTable needs a mapping, a path, or both.")
+        self.buffer = SharedBuffer(_pack_table(mapping) if mapping is not None else None, path)
+        self._count = _count.unpack_from(self.buffer.buffer(0, _count.size))[0]                                                 # The number of entries,
+        self._hashes = (ctypes.c_ulonglong * self._count).from_buffer(self.buffer._map, _count.size)                           # the sorted hashes of their keys,
+        self._bounds = (ctypes.c_ulonglong * (self._count + 1)).from_buffer(self.buffer._map, _count.size * (self._count + 1))  # and where each entry starts, followed by where the last ends.
+        self.path = path
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, key):
+        pickled = cPickle.dumps(key, cPickle.HIGHEST_PROTOCOL)
+        hashed = _point(pickled)
+        for entry in xrange(bisect.bisect_left(self._hashes, hashed), self._count):    # For each entry with the same hash, in case keys share hashes,
+            if self._hashes[entry] != hashed: break
+            key_bytes, data = self._entry(entry)
+            if data[_key_bytes.size:_key_bytes.size + key_bytes] == pickled:            # compare the pickled keys,
+                return cPickle.loads(data[_key_bytes.size + key_bytes:])               # and unpickle the value if they are equal.
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        try: self[key]
+        except KeyError: return False
+        return True
+
+    def __iter__(self):
+        for key, value in self.iteritems(): yield key
+
+    def __reduce__(self):
+        if self.path is None: raise TypeError("A SharedTable in shared memory is only shared with processes started after it is created.")
+        return (SharedTable, (None, self.path))
+
+    def get(self, key, default = None):
+        """
+        returns the value of key if in the table, otherwise default
+        """
+        try: return self[key]
+        except KeyError: return default
+
+    def iteritems(self):
+        """
+        yields each key and value in the table, unpickled
+        """
+        for entry in xrange(self._count):
+            key_bytes, data = self._entry(entry)
+            yield cPickle.loads(data[_key_bytes.size:_key_bytes.size + key_bytes]), cPickle.loads(data[_key_bytes.size + key_bytes:])
+
+    def _entry(self, entry):
+        """
+        returns the number of bytes of the pickled key of an entry, and the bytes of the entry
+        """
+        data = self.buffer[self._bounds[entry]:self._bounds[entry + 1]]
+        return _key_bytes.unpack_from(data)[0], data
+
+def share(value, path = None):
+    """
+    returns value held where processes started afterwards, such as actors given it as an attribute, read it without each holding a copy:
+    a dict as a caine.SharedTable, a numpy array as a read-only numpy array over a caine.SharedBuffer, and bytes as a caine.SharedBuffer
+
+    Parameters
+    __________
+    value : dict, numpy array, str, bytearray or buffer
+        The value to share
+    path : str or None, default None
+        If not None, the file value is written to and mapped from, otherwise value is copied into shared memory
+    """
+    if isinstance(value, dict): return SharedTable(value, path)
+    if type(value).__name__ == 'ndarray' and type(value).__module__ == 'numpy':     # Arrays are shared as arrays of the same dtype and shape.
+        import numpy
+        value = numpy.ascontiguousarray(value)
+        if value.dtype.hasobject: raise TypeError("Arrays of objects cannot be shared.")
+        if not value.nbytes:                                                            # An empty array holds nothing to share.
+            value = value.copy()
+            value.flags.writeable = False
+            return value
+        return SharedBuffer(buffer(value), path).array(value.dtype, value.shape)
+    return SharedBuffer(value, path)
+
+def _pack_table(mapping):
+    """
+    returns the bytes of a SharedTable holding the keys and values of mapping
+    """
+    entries = []
+    for key, value in mapping.iteritems():
+        pickled = cPickle.dumps(key, cPickle.HIGHEST_PROTOCOL)
+        entries.append((_point(pickled), _key_bytes.pack(len(pickled)) + pickled + cPickle.dumps(value, cPickle.HIGHEST_PROTOCOL)))
+    entries.sort(key = lambda entry: entry[0])                                          # Entries are sorted by the hash of their keys, so that keys are found by bisection.
+    bounds, start = [], _count.size * (2 * len(entries) + 2)                            # The entries follow the count, the hashes, and the bounds of the entries.
+    for _, data in entries:
+        bounds.append(start)
+        start += len(data)
+    bounds.append(start)
+    header = _count.pack(len(entries)) + struct.pack('<%sQ' %(len(entries)), *[hashed for hashed, _ in entries]) + struct.pack('<%sQ' %(len(bounds)), *bounds)
+    return header + ''.join(data for _, data in entries)
@@ -0,0 +1,117 @@
+import multiprocessing
+import math
+
+_fields = ['received', 'errors', 'busy_secs', 'idle_secs', 'expired']  # The counters kept for each actor, followed by the receive time histogram.
+_buckets = 25                                               # Bucket k of the histogram counts messages received in under 2 ** k microseconds, the last bucket counts the rest.
+_width = len(_fields) + _buckets                            # The number of counters kept for each actor.
+
+class Counters(object):
+    """
+    Runtime counters of actors kept in shared memory.
+    Each actor claims a row of its own while it runs, which only it writes, so its counters are updated without locking.
+    Actors beyond the number of rows share one more row, guarded by a lock, and the counters of actors that retired are kept in another.
+
+    Parameters
+    __________
+    rows : int, default 1
+        The number of rows of counters held by one actor each
+    """
+    def __init__(self, rows = 1):
+        self.rows = rows
+        self._counters = multiprocessing.RawArray('d', (rows + 2) * _width)            # The rows of the actors, followed by the shared row and the row of retired actors.
+        self._ids = multiprocessing.RawArray('l', rows)                                 # One more than the id of the actor holding each row, or 0 if the row is free.
+        self._lock = multiprocessing.Lock()                                             # Guards the shared row.
+
+    def claim(self, actor_id):
+        """
+        returns a free row, now held by the actor with the id given, or None if every row is held, in which case the actor records in the shared row.
+        Called only by the process starting actors.
+        """
+        for row in xrange(self.rows):
+            if not self._ids[row]:
+                self._ids[row] = actor_id + 1
+                return row
+        return None
+
+    def release(self, row):
+        """
+        frees a row once the actor holding it retired, adding its counters to those of retired actors.
+        Called only by the process starting actors, once the actor no longer records.
+        """
+        if row is None: return
+        start, retired = row * _width, (self.rows + 1) * _width
+        for i in xrange(_width):
+            self._counters[retired + i] += self._counters[start + i]
+            self._counters[start + i] = 0.
+        self._ids[row] = 0
+
+    def release_all(self):
+        """
+        frees every row
+        """
+        for row in xrange(self.rows):
+            if self._ids[row]: self.release(row)
+
+    def record(self, row, received, busy_secs, idle_secs, errors = 0, expired = 0):
+        """
+        counts messages received by the actor with the row given, or None for the shared row, the seconds spent receiving and waiting for them,
+        the exceptions raised, and the messages dropped as expired
+        """
+        if row is None:
+            with self._lock: self._record(self.rows, received, busy_secs, idle_secs, errors, expired)
+        else: self._record(row, received, busy_secs, idle_secs, errors, expired)
+
+    def total(self, field):
+        """
+        returns the sum of the counter with the name given over all rows
+        """
+        index = _fields.index(field)
+        return sum(self._counters[row * _width + index] for row in xrange(self.rows + 2))
+
+    def summary(self, row = None):
+        """
+        returns a dict of the counters of the row given, or of all rows if row is None
+        """
+        rows = xrange(self.rows + 2) if row is None else [row]
+        counters = [sum(self._counters[r * _width + i] for r in rows) for i in xrange(_width)]
+        summary = dict(zip(_fields, counters))
+        for field in ['received', 'errors', 'expired']: summary[field] = int(summary[field])
+        summary['histogram'] = [(2 ** k / 1e6 if k < _buckets - 1 else float('inf'), int(n))     # The histogram is a list of the upper bound of each bucket in seconds and the number of messages in it.
+                                for k, n in enumerate(counters[len(_fields):])]
+        summary['p50_secs'] = _percentile(summary['histogram'], .5)
+        summary['p99_secs'] = _percentile(summary['histogram'], .99)
+        return summary
+
+    def by_actor(self):
+        """
+        returns a dict of the counters of each actor holding a row in which any message was received, exception raised or message dropped as expired,
+        by actor_id, with those of the shared row by None
+        """
+        summaries = dict((self._ids[row] - 1, self.summary(row)) for row in xrange(self.rows) if self._ids[row] and self._active(row))
+        if self._active(self.rows): summaries[None] = self.summary(self.rows)
+        return summaries
+
+    def _active(self, row):
+        return any(self._counters[row * _width + i] for i in (0, 1, 4))
+
+    def _record(self, row, received, busy_secs, idle_secs, errors, expired):
+        start = row * _width                                                            # Find where the counters of the row start.
+        self._counters[start] += received
+        self._counters[start + 1] += errors
+        self._counters[start + 2] += busy_secs
+        self._counters[start + 3] += idle_secs
+        self._counters[start + 4] += expired
+        if received:                                                                    # Count the messages in the bucket for the seconds spent receiving each.
+            exponent = math.frexp(busy_secs * 1e6 / received)[1]
+            self._counters[start + len(_fields) + max(0, min(exponent, _buckets - 1))] += received
+
+def _percentile(histogram, q):
+    """
+    returns the upper bound of the bucket of the histogram holding its q quantile, or None if the histogram is empty
+    """
+    total = sum(n for _, n in histogram)
+    if not total: return None
+    seen = 0
+    for bound, n in histogram:
+        seen += n
+        if seen >= q * total: return bound
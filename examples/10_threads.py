@@ -0,0 +1,51 @@
+### Example of actors running in threads, and an actor receiving many messages at once
+
+from caine import ThreadCast, AsyncActor
+import threading
+import time
+
+# Wait on something slow, like a disk or a socket, then print stuff
+def wait_deliver(message, actor_attributes):
+    time.sleep(1)
+    print 'Actor #%s says, "I got message #%s."' %(actor_attributes['actor_id'], message)
+
+def end_scene(instance_attributes):
+    print "End scene."
+
+# Create my_cast with 3 actors, each a thread of this process
+my_cast = ThreadCast(receive = wait_deliver, callback = end_scene, num = 3)
+
+my_cast()
+
+for i in xrange(3):
+    my_cast.inbox.put(i)
+
+my_cast.cut()
+
+# Wait on something slow, then count the message
+def wait_count(message, instance_attributes):
+    time.sleep(1)
+    with instance_attributes['lock']:
+        instance_attributes['count'] += 1
+
+def print_count(instance_attributes):
+    print "I got %s messages." %(instance_attributes['count'])
+
+# Create my_actor which receives as many as 100 messages at once
+my_actor = AsyncActor(receive = wait_count, callback = print_count, concurrency = 100, count = 0, lock = threading.Lock())
+
+my_actor()
+
+# All 100 messages are received in about a second
+for i in xrange(100):
+    my_actor.inbox.put(i)
+
+my_actor.cut()
+
+# Output
+# ------
+# Actor #0 says, "I got message #0."
+# Actor #1 says, "I got message #1."
+# Actor #2 says, "I got message #2."
+# End scene.
+# I got 100 messages.
\ No newline at end of file
@@ -0,0 +1,40 @@
+### Example of a pipeline of stages, in place of the relay of 6_relay.py
+
+from caine import Pipeline, Stage
+import time
+
+def square(num, stage_attributes):
+    time.sleep(.2)
+    return num**2
+
+# Returning None passes nothing on to the next stage
+def drop_even(num, stage_attributes):
+    return num if num % 2 else None
+
+def add(num, stage_attributes):
+    return num + stage_attributes['amount']
+
+def append_all(num, num_list, instance_attributes):
+    return num_list + [num] if num_list is not None else [num]
+
+def print_collected(instance_attributes):
+    print "I collected these numbers: %s" %(sorted(instance_attributes['collected']))
+
+# Squares are taken by 3 actors, then odd squares are passed on without an inbox in between.
+# No more than 5 numbers wait to be squared, so putting numbers waits on the actors.
+my_pipeline = Pipeline([Stage(square, num = 3, maxsize = 5),
+                        Stage(drop_even, fuse = True),
+                        Stage(add, amount = 3)],
+                       collect = append_all, callback = print_collected)
+
+my_pipeline()
+
+for i in xrange(10):
+    my_pipeline.put(i)
+
+# Cut is passed from stage to stage
+my_pipeline.cut()
+
+# Output
+# ------
+# I collected these numbers: [4, 12, 28, 52, 84]
\ No newline at end of file
@@ -0,0 +1,30 @@
+### Example of collecting messages using multiple processes
+
+from caine import ParallelCollector
+from collections import Counter
+
+# Each process counts the words it gets
+def count_words(line, word_counts, instance_attributes):
+    word_counts = word_counts if word_counts is not None else Counter()
+    word_counts.update(line.split())
+    return word_counts
+
+# The counts of two processes are added together
+def add_counts(word_counts, other_word_counts):
+    return word_counts + other_word_counts
+
+def print_collected(instance_attributes):
+    print "The most common words are: %s" %(instance_attributes['collected'].most_common(2))
+
+# Create my_collector with 4 processes counting words
+my_collector = ParallelCollector(collect = count_words, combine = add_counts, callback = print_collected, num = 4)
+
+my_collector()
+
+my_collector.put_many(["to be or not to be"] * 10000 + ["that is the question"] * 1000, chunksize = 100)
+
+my_collector.cut()
+
+# Output
+# ------
+# The most common words are: [('be', 20000), ('to', 20000)]
\ No newline at end of file
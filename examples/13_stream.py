@@ -0,0 +1,32 @@
+### Example of streaming what a collector has collected while it is collecting
+
+from caine import Collector
+
+def total(number, prior_total, instance_attributes):
+    return number + (prior_total or 0)
+
+def end_scene(instance_attributes):
+    pass
+
+# Emit the total of each 250 numbers, starting over after each
+my_collector = Collector(collect = total, callback = end_scene, stream_every = 250, stream_delta = True)
+
+my_collector()
+
+my_collector.feed(xrange(1000), chunksize = 50, cut = True)
+
+# Totals are yielded as they are emitted, and the loop ends once collection is done
+partial_totals = []
+for partial_total in my_collector.stream():
+    print "Partial total: %s" %(partial_total)
+    partial_totals.append(partial_total)
+
+print "The total is %s." %(sum(partial_totals))
+
+# Output
+# ------
+# Partial total: 31125
+# Partial total: 93625
+# Partial total: 156125
+# Partial total: 218625
+# The total is 499500.
\ No newline at end of file
@@ -0,0 +1,43 @@
+### Example of choosing how messages are encoded
+
+from caine import SupportingActor, Collector, RingInbox, BufferCodec, MarshalCodec
+
+def deliver(message, instance_attributes):
+    print "I got %s with %s bytes of %s." %(message['name'], len(message['data']), type(message['data']).__name__)
+
+def end_scene(instance_attributes):
+    print "End scene."
+
+# Large buffers anywhere in a message are copied straight into and out of shared memory, rather than pickled
+my_actor = SupportingActor(receive = deliver, callback = end_scene, inbox = RingInbox(codec = BufferCodec()))
+
+my_actor()
+
+my_actor.inbox.put({'name' : 'a picture', 'data' : bytearray(10 ** 7)})
+my_actor.inbox.put({'name' : 'a script', 'data' : 'x' * 10 ** 6})
+
+my_actor.cut()
+
+def add(number, total, instance_attributes):
+    print "I got %s, making a total of %s." %(number, number + (total or 0))
+    return number + (total or 0)
+
+# Messages of simple types are encoded faster by marshal than by pickle
+my_collector = Collector(collect = add, callback = end_scene, codec = MarshalCodec())
+
+my_collector()
+
+for i in xrange(3):
+    my_collector.inbox.put(i)
+
+my_collector.cut()
+
+# Output
+# ------
+# I got a picture with 10000000 bytes of bytearray.
+# I got a script with 1000000 bytes of str.
+# End scene.
+# I got 0, making a total of 0.
+# I got 1, making a total of 1.
+# I got 2, making a total of 3.
+# End scene.
\ No newline at end of file
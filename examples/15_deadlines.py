@@ -0,0 +1,34 @@
+### Example of dropping messages that wait too long, and of a timeout of less than a second
+
+from caine import SupportingActor
+import time
+
+def wait_deliver(message, instance_attributes):
+    time.sleep(.2)
+    print "I got message #%s." %(message)
+
+def end_scene(instance_attributes):
+    print "End scene."
+
+# End processing after half a second without messages
+my_actor = SupportingActor(receive = wait_deliver, callback = end_scene, timeout = .5)
+
+# Each message is dropped unless taken from the inbox within a second
+for i in xrange(10):
+    my_actor.put(i, ttl = 1.)
+
+my_actor()
+
+my_actor.process.join()
+
+print "%s messages were received and %s expired." %(my_actor.stats()['received'], my_actor.stats()['expired'])
+
+# Output
+# ------
+# I got message #0.
+# I got message #1.
+# I got message #2.
+# I got message #3.
+# I got message #4.
+# End scene.
+# 5 messages were received and 5 expired.
\ No newline at end of file
@@ -0,0 +1,35 @@
+### Example of a SupportingActor receiving control messages ahead of bulk messages
+
+from caine import SupportingActor, PriorityInbox
+import time
+
+def deliver(message, instance_attributes):
+    time.sleep(.1)
+    print "I got %s message #%s." %message
+
+def end_scene(instance_attributes):
+    print "End scene."
+
+# Messages are put in the bulk mailbox unless they are control messages,
+# and are taken from the bulk mailbox only once the control mailbox is empty
+inbox = PriorityInbox(mailboxes = ['control', 'bulk'], route = lambda message: message[0])
+
+my_actor = SupportingActor(receive = deliver, callback = end_scene, inbox = inbox)
+
+for i in xrange(3):
+    my_actor.put(('bulk', i))
+
+# The control message overtakes the bulk messages put before it
+my_actor.put(('control', 0))
+
+my_actor()
+
+my_actor.cut()
+
+# Output
+# ------
+# I got control message #0.
+# I got bulk message #0.
+# I got bulk message #1.
+# I got bulk message #2.
+# End scene.
\ No newline at end of file
@@ -0,0 +1,33 @@
+### Example of a SupportingCast receiving messages with the same key by the same actor
+
+from caine import SupportingCast
+
+# Count the messages for each customer received by the actor, keeping the counts in its attributes
+def count_orders(message, actor_attributes):
+    counts = actor_attributes.get('counts', {})
+    counts[message['customer']] = counts.get(message['customer'], 0) + 1
+    print 'Actor #%s got order #%s of %s.' %(actor_attributes['actor_id'], counts[message['customer']], message['customer'])
+    return {'counts' : counts}
+
+def end_scene(instance_attributes):
+    print "End scene."
+
+# Orders of the same customer go to the same actor, in order, so that its counts are complete
+my_cast = SupportingCast(receive = count_orders, callback = end_scene, num = 3, key = lambda message: message['customer'])
+
+my_cast()
+
+for customer in ['Alfie', 'Harry', 'Charlie', 'Alfie', 'Harry', 'Alfie']:
+    my_cast.put({'customer' : customer})
+
+my_cast.cut()
+
+# Output
+# ------
+# Actor #0 got order #1 of Alfie.
+# Actor #0 got order #2 of Alfie.
+# Actor #0 got order #3 of Alfie.
+# Actor #1 got order #1 of Harry.
+# Actor #1 got order #1 of Charlie.
+# Actor #1 got order #2 of Harry.
+# End scene.
\ No newline at end of file
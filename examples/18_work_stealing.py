@@ -0,0 +1,30 @@
+### Example of a SupportingCast whose actors take messages from local inboxes and steal work from each other
+
+from caine import SupportingCast
+import time
+
+# Some messages take much longer than others
+def work(message, actor_attributes):
+    time.sleep(.1 if message % 10 == 0 else .001)
+
+def end_scene(instance_attributes):
+    print "End scene."
+
+# Messages put in my_cast are spread across a local inbox for each of 4 actors,
+# and actors done with their own messages steal those of busier actors
+my_cast = SupportingCast(receive = work, callback = end_scene, num = 4, steal = True)
+
+my_cast()
+
+my_cast.put_many(xrange(200), chunksize = 10)
+
+my_cast.cut()
+
+my_cast.join()
+
+print "%s messages were received by %s actors." %(my_cast.stats()['received'], len(my_cast.stats()['actors']))
+
+# Output
+# ------
+# End scene.
+# 200 messages were received by 4 actors.
\ No newline at end of file
@@ -0,0 +1,37 @@
+### Example of creating many actors quickly, sharing one manager for their inboxes
+
+from caine import SupportingActor, preload
+import multiprocessing
+import time
+
+def deliver(message, instance_attributes):
+    instance_attributes['squares'][message] = message * message
+
+def end_scene(instance_attributes):
+    pass
+
+# Import the modules the actors need and start the manager serving their inboxes before creating them
+preload('json', 'collections')
+
+started = time.time()
+
+# Every actor's inbox is a queue of the same manager, so no process is started per actor
+squares = multiprocessing.RawArray('l', 100)
+my_actors = [SupportingActor(receive = deliver, callback = end_scene, squares = squares) for _ in xrange(100)]
+
+print "Created %s actors in under a second: %s" %(len(my_actors), time.time() - started < 1.)
+
+for i, my_actor in enumerate(my_actors):
+    my_actor()
+    my_actor.put(i)
+    my_actor.cut()
+
+for my_actor in my_actors:
+    my_actor.join()
+
+print "The squares add up to %s." %(sum(squares))
+
+# Output
+# ------
+# Created 100 actors in under a second: True
+# The squares add up to 328350.
\ No newline at end of file
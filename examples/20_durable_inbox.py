@@ -0,0 +1,43 @@
+### Example of an inbox on disk whose messages are received again after the actor receiving them dies
+
+from caine import SupportingActor, DurableInbox
+import os
+import signal
+import tempfile
+
+# Die the first time message #2 is received, without a chance to clean up
+def fragile_deliver(message, instance_attributes):
+    if message == 2 and not os.path.exists(instance_attributes['marker']):
+        open(instance_attributes['marker'], 'w').close()
+        os.kill(os.getpid(), signal.SIGKILL)
+    print "I got message #%s." %(message)
+
+def end_scene(instance_attributes):
+    print "End scene."
+
+directory = tempfile.mkdtemp()
+
+# Messages are kept in files in directory until they are received
+my_actor = SupportingActor(receive = fragile_deliver, callback = end_scene, inbox = DurableInbox(os.path.join(directory, 'inbox')),
+                           marker = os.path.join(directory, 'died'))
+
+for i in xrange(4):
+    my_actor.put(i)
+
+my_actor()
+my_actor.join()
+
+print "My actor died."
+
+# Restarting the actor receives message #2 again, then the rest
+my_actor()
+my_actor.cut()
+
+# Output
+# ------
+# I got message #0.
+# I got message #1.
+# My actor died.
+# I got message #2.
+# I got message #3.
+# End scene.
\ No newline at end of file
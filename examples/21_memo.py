@@ -0,0 +1,50 @@
+### Example of a SupportingCast whose actors share a cache of the results of an expensive function
+
+from caine import SupportingCast, Collector, Memo
+import time
+
+# Results are kept for up to 1000 words, by the word in lower case, in shared memory seen by every actor
+cache = Memo(maxsize = 1000, key = lambda word: word.lower())
+
+@cache
+def score(word):
+    time.sleep(.1)
+    return sum(ord(c) for c in word.lower())
+
+def work(message, actor_attributes):
+    actor_attributes['outbox'].put((message, score(message)))
+
+def end_scene(instance_attributes):
+    pass
+
+def collect(message, scores, instance_attributes):
+    scores = scores or {}
+    scores[message[0]] = message[1]
+    return scores
+
+def show(instance_attributes):
+    print "Scores: %s" %(sorted(instance_attributes['collected'].items()))
+
+my_collector = Collector(collect = collect, callback = show)
+
+# The 4 actors score 3 distinct words only once between them, those asking for a word being scored waiting for its score
+my_cast = SupportingCast(receive = work, callback = end_scene, num = 4, outbox = my_collector.inbox)
+
+my_collector()
+my_cast()
+
+my_cast.put_many(['caine', 'Caine', 'CAINE', 'actor', 'Actor', 'cast'] * 10)
+
+my_cast.cut()
+my_cast.join()
+
+my_collector.cut()
+my_collector.join()
+
+stats = cache.stats()
+print "%s scores computed, %s taken from the cache." %(stats['misses'], stats['hits'])
+
+# Output
+# ------
+# Scores: [('Actor', 537), ('CAINE', 512), ('Caine', 512), ('actor', 537), ('caine', 512), ('cast', 427)]
+# 3 scores computed, 57 taken from the cache.
\ No newline at end of file
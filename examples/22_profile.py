@@ -0,0 +1,39 @@
+### Example of profiling the actors of a SupportingCast
+
+from caine import SupportingCast
+import tempfile
+import time
+
+def parse(message):
+    return [int(field) for field in message.split(',')]
+
+def work(message, actor_attributes):
+    time.sleep(.001)
+    return {'total' : actor_attributes.get('total', 0) + sum(parse(message))}
+
+def end_scene(instance_attributes):
+    print "End scene."
+
+# Each actor process writes a profile of its inbox reception loop to the profile directory,
+# and the profiles are merged into profile.prof there once the actors are done
+my_cast = SupportingCast(receive = work, callback = end_scene, num = 3, profile = tempfile.mkdtemp())
+
+my_cast()
+
+my_cast.put_many(','.join(str(i) for i in xrange(n)) for n in xrange(1, 301))
+
+my_cast.cut()
+my_cast.join()
+
+# The merged profile holds the calls made by all actors, where time spent waiting on the inbox is under _next and time spent receiving messages under work
+stats = my_cast.profile_stats()
+calls = dict((function[2], stat[1]) for function, stat in stats.stats.iteritems() if function[2] in ('work', 'parse'))
+print "Calls: %s" %(sorted(calls.items()))
+
+# Print the 5 functions in which the actors spent the most time
+# stats.sort_stats('cumulative').print_stats(5)
+
+# Output
+# ------
+# End scene.
+# Calls: [('parse', 300), ('work', 300)]
\ No newline at end of file
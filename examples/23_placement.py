@@ -0,0 +1,29 @@
+### Example of pinning the actors of a SupportingCast to CPUs
+
+from caine import SupportingCast, Placement
+
+def work(message, actor_attributes):
+    sum(xrange(message))
+
+def end_scene(instance_attributes):
+    print "End scene."
+
+# The cast uses at most 2 of the CPUs this process may run on, spread across sockets,
+# with each actor pinned to one of them in turn and the directing process free to run on either
+my_cast = SupportingCast(receive = work, callback = end_scene, num = 4, placement = Placement(budget = 2))
+
+my_cast()
+
+my_cast.put_many(xrange(10000))
+
+my_cast.cut()
+my_cast.join()
+
+# The CPUs each process was pinned to, by 'director' and actor_id
+placement = my_cast.stats()['placement']
+print "The director may run on %s CPU(s), each actor on %s." %(len(placement['director']), sorted(set(len(cpus) for actor_id, cpus in placement.items() if actor_id != 'director')))
+
+# Output on a machine with at least 2 CPUs
+# ----------------------------------------
+# End scene.
+# The director may run on 2 CPU(s), each actor on [1].
\ No newline at end of file
@@ -0,0 +1,41 @@
+### Example of a large read-only attribute shared by the actors of a SupportingCast without each holding a copy
+
+from caine import SupportingCast, Collector, share
+
+# A lookup table held in shared memory, from which each actor unpickles only the values it looks up
+prices = share(dict(('item-%s' % i, i * .5) for i in xrange(100000)))
+
+def price(message, actor_attributes):
+    actor_attributes['outbox'].put(actor_attributes['prices'].get(message, 0.))
+
+def end_scene(instance_attributes):
+    pass
+
+def total(message, collected, instance_attributes):
+    return (collected or 0.) + message
+
+def show(instance_attributes):
+    print "The order costs %s." %(instance_attributes['collected'])
+
+my_collector = Collector(collect = total, callback = show)
+
+# Every actor is given the table as an attribute, which refers to the same shared memory in each
+my_cast = SupportingCast(receive = price, callback = end_scene, num = 4, prices = prices, outbox = my_collector.inbox)
+
+my_collector()
+my_cast()
+
+my_cast.put_many(['item-%s' % i for i in xrange(0, 100000, 1000)] + ['no such item'])
+
+my_cast.cut()
+my_cast.join()
+
+my_collector.cut()
+my_collector.join()
+
+print "The table holds %s prices in %s bytes." %(len(prices), len(prices.buffer))
+
+# Output
+# ------
+# The order costs 2475000.0.
+# The table holds 100000 prices in 4888906 bytes.
\ No newline at end of file
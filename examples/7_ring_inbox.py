@@ -0,0 +1,27 @@
+### Example of a SupportingActor with an inbox in shared memory
+
+from caine import SupportingActor, RingInbox
+
+# Print the number of bytes in each message
+def count_bytes(message, instance_attributes):
+    print 'I got a %s of %s bytes.' %(type(message).__name__, len(message))
+
+def end_scene(instance_attributes):
+    print "End scene."
+
+# Create my_actor with an inbox holding at most 8 messages in 1 MB of shared memory
+my_actor = SupportingActor(receive = count_bytes, callback = end_scene, inbox = RingInbox(maxsize = 8, capacity = 2 ** 20))
+
+my_actor()
+
+# str and bytearray messages are copied into shared memory as they are, without pickling
+my_actor.inbox.put("x" * 1000)
+my_actor.inbox.put(bytearray(5000))
+
+my_actor.cut()
+
+# Output
+# ------
+# I got a str of 1000 bytes.
+# I got a bytearray of 5000 bytes.
+# End scene.
\ No newline at end of file
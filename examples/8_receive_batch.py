@@ -0,0 +1,38 @@
+### Example of receiving messages in batches
+
+from caine import SupportingActor, Collector
+
+# Print how many messages arrived together and their total
+def deliver_sum(messages, instance_attributes):
+    print 'I got %s messages adding up to %s.' %(len(messages), sum(messages))
+
+# Add a batch of messages to the running total
+def collect_sum(messages, total, instance_attributes):
+    return sum(messages) + (total or 0)
+
+def print_collected(instance_attributes):
+    print "I collected a total of %s." %(instance_attributes['collected'])
+
+# Create my_actor which receives at most 4 messages at a time
+my_actor = SupportingActor(receive_batch = deliver_sum, max_batch = 4)
+
+# Create my_collector which collects batches of messages gathered for at most .1 seconds
+my_collector = Collector(collect_batch = collect_sum, callback = print_collected, max_latency = .1)
+
+for i in xrange(10):
+    my_actor.inbox.put(i)
+    my_collector.inbox.put(i)
+
+my_actor()
+my_collector()
+
+my_actor.cut()
+my_collector.cut()
+
+# Output
+# ------
+# I got 4 messages adding up to 6.
+# I got 4 messages adding up to 22.
+# I got 2 messages adding up to 17.
+# Inbox processing done.
+# I collected a total of 45.
\ No newline at end of file
@@ -0,0 +1,37 @@
+### Example of putting many messages in an inbox at once
+
+from caine import Collector, SupportingActor
+
+def add(number, total, instance_attributes):
+    return number + (total or 0)
+
+def print_collected(instance_attributes):
+    print "I collected a total of %s." %(instance_attributes['collected'])
+
+my_collector = Collector(collect = add, callback = print_collected, maxsize = 10)
+
+my_collector()
+
+# Put a million numbers in the inbox, 1000 at a time.
+# No more than 10 chunks of 1000 are waiting in the inbox at once.
+my_collector.put_many(xrange(1000000), chunksize = 1000)
+
+my_collector.cut()
+
+def deliver(message, instance_attributes):
+    print message
+
+my_actor = SupportingActor(receive = deliver)
+
+my_actor()
+
+# Put messages from a generator in the inbox from a separate thread, then cut
+feeder = my_actor.feed(("I got message #%s." %(i) for i in xrange(3)), cut = True)
+
+# Output
+# ------
+# I got message #0.
+# I got message #1.
+# I got message #2.
+# Inbox processing done.
+# I collected a total of 499999500000.
\ No newline at end of file
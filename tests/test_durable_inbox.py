@@ -0,0 +1,55 @@
+import unittest
+import tempfile
+import shutil
+import os
+import multiprocessing
+from caine import DurableInbox
+
+def _take_and_die(inbox, num):
+    for i in xrange(num): inbox.get()
+    os._exit(1)
+
+class TestDurableInbox(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_backlog_keeps_few_segments_mapped(self):
+        inbox = DurableInbox(self.path, segment_bytes = 2 ** 16)
+        message = 'x' * 1000
+        for i in xrange(2000):                                                  # A backlog of about 30 segments,
+            inbox.put(message)
+            self.assertLessEqual(len(inbox._segments), 2)                       # with only the segments written and read mapped.
+        for i in xrange(2000):
+            self.assertEqual(inbox.get(), message)
+            self.assertLessEqual(len(inbox._segments), 2)
+            inbox.ack()
+        self.assertLessEqual(len([name for name in os.listdir(self.path) if name.endswith('.seg')]), 2)
+
+    def test_reclaim_returns_messages_of_dead_process(self):
+        inbox = DurableInbox(self.path, segment_bytes = 2 ** 16)
+        for i in xrange(10): inbox.put(i)
+        process = multiprocessing.Process(target = _take_and_die, args = [inbox, 3])
+        process.start()
+        process.join()
+        self.assertEqual(inbox.qsize(), 7)
+        self.assertEqual(inbox.reclaim(), 1)                                    # The slot of the dead process is freed,
+        self.assertEqual(inbox.qsize(), 10)
+        self.assertEqual(sorted(inbox.get() for i in xrange(10)), range(10))    # and its messages are received again.
+        inbox.ack()
+        self.assertEqual(inbox._commit.value, inbox._head.value)
+
+    def test_slots_of_dead_processes_are_reused(self):
+        inbox = DurableInbox(self.path, segment_bytes = 2 ** 16)
+        for i in xrange(300): inbox.put(i)
+        for i in xrange(300):                                                   # More processes die holding slots than there are slots,
+            process = multiprocessing.Process(target = _take_and_die, args = [inbox, 1])
+            process.start()
+            process.join()
+        self.assertEqual(inbox.get(timeout = 1.), 0)                                    # yet messages are still taken.
+
+if __name__ == '__main__':
+    unittest.main()
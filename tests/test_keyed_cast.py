@@ -0,0 +1,33 @@
+import unittest
+import multiprocessing
+import time
+from caine import SupportingCast
+from caine.caine import _HashRing, _mailbox_maxsize
+
+_slow = multiprocessing.Value('i', 1)
+
+def _receive(message, instance_attributes):
+    if _slow.value: time.sleep(.05)
+
+class TestKeyedCast(unittest.TestCase):
+
+    def test_cut_completes_once_owner_of_full_mailbox_is_parked(self):
+        key = next(key for key in xrange(100) if _HashRing([0, 1]).owner(key) == 1)
+        num = _mailbox_maxsize + 100
+        _slow.value = 1
+        cast = SupportingCast(num = 2, key = lambda message: message, receive = _receive, callback = lambda instance_attributes: None)
+        cast()
+        cast.put_many([key] * num, chunksize = 1)                               # Fill the mailbox of actor 1, leaving the router waiting on it,
+        while cast._counters.total('received') < 20: time.sleep(.1)             # the actor receiving a message only every .05 seconds,
+        cast.remove(1)                                                          # then park actor 1.
+        time.sleep(.5)
+        _slow.value = 0
+        cast.cut()
+        try: self.assertTrue(cast.wait(15))                                     # The messages waiting for actor 1 go to actor 0, and Cut is taken,
+        finally:
+            if not cast.wait(0): cast.cut(immediate = True)
+            cast.join()
+        self.assertEqual(cast.stats()['received'], num)                         # so every message is received.
+
+if __name__ == '__main__':
+    unittest.main()